@@ -0,0 +1,290 @@
+"""Simulated Docker Engine API on a unix socket.
+
+Serves the endpoints the integration uses for a configurable number of
+synthetic containers, with a fixed latency per request. Containers change
+state as the list is fetched (churn) or on a timer (events), and every
+change is published on the events stream. Stats streams send a sample per
+container at a fixed interval. The images are pulled from a registry by
+the digests benchmarks.fake_registry serves. Run standalone to point a
+development instance at it:
+
+    python -m benchmarks.fake_engine --socket /tmp/fake-docker.sock --containers 1000
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+from collections import Counter
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+IMAGES = 20
+PROJECTS = 50
+REGISTRY = 'registry.example.com'
+
+
+def timestamp():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f000Z')
+
+
+def manifest_digest(index, generation=0):
+    """Return the digest of a version of the manifest of tag app:index."""
+    return 'sha256:' + hashlib.sha256('app:{}/{}'.format(index, generation).encode()).hexdigest()
+
+
+class FakeContainer:
+    """A synthetic container, with only what the endpoints return."""
+
+    def __init__(self, index, registry=REGISTRY):
+        self.id = '{:064x}'.format(index + 1)
+        self.name = 'container-{}'.format(index)
+        self.image = '{}/app:{}'.format(registry, index % IMAGES)
+        self.image_id = 'sha256:{:064x}'.format(index % IMAGES)
+        self.labels = {'com.docker.compose.project': 'stack-{}'.format(index % PROJECTS)}
+        self.status = 'running' if index % 3 else 'exited'
+        self.started_at = timestamp()
+        self.restart_count = 0
+        self.counters = [0, 0]
+
+    def summary(self):
+        return {
+            'Id': self.id,
+            'Names': ['/' + self.name],
+            'Image': self.image,
+            'ImageID': self.image_id,
+            'State': self.status,
+            'Status': 'Up 3 hours' if self.status == 'running' else 'Exited (0) 3 hours ago',
+            'Created': 1600000000,
+            'Labels': self.labels
+        }
+
+    def inspect(self):
+        return {
+            'Id': self.id,
+            'Name': '/' + self.name,
+            'Image': self.image_id,
+            'RestartCount': self.restart_count,
+            'State': {
+                'Status': self.status,
+                'StartedAt': self.started_at,
+                'ExitCode': 0,
+                'OOMKilled': False
+            },
+            'Config': {'Image': self.image, 'Labels': self.labels}
+        }
+
+    def stats(self):
+        self.counters[0] += 10 ** 7
+        self.counters[1] += 10 ** 9
+        return {
+            'cpu_stats': {
+                'cpu_usage': {'total_usage': self.counters[0]},
+                'system_cpu_usage': self.counters[1],
+                'online_cpus': 4
+            },
+            'memory_stats': {'usage': 64 * 1024 * 1024, 'limit': 1024 * 1024 * 1024, 'stats': {}},
+            'networks': {'eth0': {'rx_bytes': self.counters[0] // 10, 'tx_bytes': self.counters[0] // 20}},
+            'blkio_stats': {'io_service_bytes_recursive': []}
+        }
+
+
+class FakeEngine:
+    """The simulated daemon.
+
+    churn is the fraction of containers that change state on every list
+    call; event_interval, if set, changes one container at that interval
+    instead, as a busy host followed through events would.
+    """
+
+    def __init__(self, count, latency=0.0, churn=0.0, event_interval=None,
+                 stats_interval=1.0, seed=0, registry=REGISTRY):
+        self.containers = [FakeContainer(index, registry) for index in range(count)]
+        self.registry = registry
+        self.by_id = {container.id: container for container in self.containers}
+        self.latency = latency
+        self.churn = churn
+        self.event_interval = event_interval
+        self.stats_interval = stats_interval
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self._subscribers = set()
+        self._runner = None
+        self._tasks = []
+
+    def create_app(self):
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get('/version', self.version)
+        app.router.add_get('/containers/json', self.list_containers)
+        app.router.add_get('/containers/{id}/json', self.inspect_container)
+        app.router.add_get('/containers/{id}/stats', self.stats)
+        app.router.add_post('/containers/{id}/{action}', self.action)
+        app.router.add_get('/images/{id}/json', self.inspect_image)
+        app.router.add_get('/system/df', self.df)
+        app.router.add_get('/events', self.events)
+        return app
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        resource = request.match_info.route.resource
+        self.calls['{} {}'.format(request.method, resource.canonical if resource else request.path)] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return await handler(request)
+
+    def set_status(self, container, status, action):
+        """Change the status of a container and publish the event."""
+        if status == 'running' and container.status != 'running':
+            container.started_at = timestamp()
+        container.status = status
+        event = {
+            'Type': 'container',
+            'Action': action,
+            'Actor': {'ID': container.id, 'Attributes': dict(container.labels, name=container.name)},
+            'time': int(datetime.now().timestamp())
+        }
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+
+    def mutate(self, count):
+        """Stop running containers and start stopped ones, at random."""
+        for container in self.random.sample(self.containers, min(count, len(self.containers))):
+            if container.status == 'running':
+                self.set_status(container, 'exited', 'die')
+            else:
+                self.set_status(container, 'running', 'start')
+
+    async def version(self, request):
+        return web.json_response({
+            'Version': '24.0.0', 'ApiVersion': '1.43', 'Os': 'linux',
+            'Arch': 'amd64', 'KernelVersion': '6.1.0'
+        })
+
+    async def list_containers(self, request):
+        if self.churn:
+            self.mutate(int(len(self.containers) * self.churn))
+        show_all = request.query.get('all') == '1'
+        return web.json_response([
+            container.summary() for container in self.containers
+            if show_all or container.status == 'running'
+        ])
+
+    def _get(self, request):
+        container = self.by_id.get(request.match_info['id'])
+        if container is None:
+            raise web.HTTPNotFound(
+                text=json.dumps({'message': 'No such container'}), content_type='application/json'
+            )
+        return container
+
+    async def inspect_container(self, request):
+        return web.json_response(self._get(request).inspect())
+
+    async def inspect_image(self, request):
+        image_id = request.match_info['id']
+        index = int(image_id.rpartition(':')[2], 16)
+        return web.json_response({
+            'Id': image_id,
+            'RepoTags': ['{}/app:{}'.format(self.registry, index)],
+            'RepoDigests': ['{}/app@{}'.format(self.registry, manifest_digest(index))]
+        })
+
+    async def action(self, request):
+        container = self._get(request)
+        action = request.match_info['action']
+        status = {
+            'start': 'running', 'stop': 'exited', 'restart': 'running',
+            'pause': 'paused', 'unpause': 'running'
+        }.get(action)
+        if status is None:
+            raise web.HTTPNotFound()
+        if action == 'restart':
+            container.restart_count += 1
+        self.set_status(container, status, action)
+        return web.Response(status=204)
+
+    async def df(self, request):
+        return web.json_response({
+            'LayersSize': IMAGES * 100 * 1000 * 1000,
+            'Images': [{'Id': 'sha256:{:064x}'.format(index), 'Size': 100 * 1000 * 1000} for index in range(IMAGES)],
+            'Containers': [{'Id': container.id, 'SizeRw': 1000 * 1000} for container in self.containers],
+            'Volumes': [],
+            'BuildCache': []
+        })
+
+    async def _stream(self, request):
+        response = web.StreamResponse()
+        response.content_type = 'application/json'
+        await response.prepare(request)
+        return response
+
+    async def events(self, request):
+        response = await self._stream(request)
+        queue = asyncio.Queue()
+        self._subscribers.add(queue)
+        try:
+            while True:
+                event = await queue.get()
+                await response.write(json.dumps(event).encode() + b'\n')
+        finally:
+            self._subscribers.discard(queue)
+
+    async def stats(self, request):
+        container = self._get(request)
+        response = await self._stream(request)
+        while True:
+            await response.write(json.dumps(container.stats()).encode() + b'\n')
+            await asyncio.sleep(self.stats_interval)
+
+    async def _async_generate_events(self):
+        while True:
+            await asyncio.sleep(self.event_interval)
+            self.mutate(1)
+
+    async def start(self, path):
+        """Serve the API on a unix socket."""
+        if os.path.exists(path):
+            os.unlink(path)
+        self._runner = web.AppRunner(self.create_app())
+        await self._runner.setup()
+        await web.UnixSite(self._runner, path).start()
+        if self.event_interval:
+            self._tasks.append(asyncio.ensure_future(self._async_generate_events()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+def serve(path, count, latency=0.0, churn=0.0, event_interval=None, stats_interval=1.0,
+          registry=REGISTRY):
+    """Run an engine until the process is terminated."""
+    async def run():
+        engine = FakeEngine(count, latency, churn, event_interval, stats_interval, registry=registry)
+        await engine.start(path)
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--socket', default='/tmp/fake-docker.sock')
+    parser.add_argument('--containers', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds per request")
+    parser.add_argument('--churn', type=float, default=0.0, help="fraction changed per list call")
+    parser.add_argument('--event-interval', type=float, default=None)
+    parser.add_argument('--stats-interval', type=float, default=1.0)
+    parser.add_argument('--registry', default=REGISTRY, help="registry the images come from")
+    args = parser.parse_args()
+    print("Serving {} containers on {}".format(args.containers, args.socket))
+    serve(args.socket, args.containers, args.latency, args.churn, args.event_interval, args.stats_interval,
+          args.registry)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""Simulated image registry for the update checks.
+
+Serves the manifest digests of the tags of benchmarks.fake_engine's images
+(app:0 to app:N) behind anonymous bearer token authentication, as Docker
+Hub does. A fraction of the tags has been pushed again, so its digest
+differs from the one the fake engine reports the image was pulled by.
+Point the fake engine at it to have update checks hit it:
+
+    python -m benchmarks.fake_registry --port 5000 --updated 0.1
+    python -m benchmarks.fake_engine --registry localhost:5000
+"""
+import argparse
+import asyncio
+import uuid
+from collections import Counter
+
+from aiohttp import web
+
+from .fake_engine import IMAGES, manifest_digest
+
+
+class FakeRegistry:
+    """The simulated registry, with a single repository named app."""
+
+    def __init__(self, updated=0.0, token_lifetime=300):
+        self.generations = {
+            index: 1 if index < IMAGES * updated else 0 for index in range(IMAGES)
+        }
+        self.token_lifetime = token_lifetime
+        self.tokens = set()
+        self.calls = Counter()
+        self._runner = None
+
+    def create_app(self):
+        app = web.Application()
+        app.router.add_route('HEAD', '/v2/{repository:.+}/manifests/{tag}', self.manifest)
+        app.router.add_get('/token', self.token)
+        return app
+
+    def push(self, index):
+        """Publish a new version of a tag."""
+        self.generations[index] += 1
+
+    async def token(self, request):
+        self.calls['token'] += 1
+        token = uuid.uuid4().hex
+        self.tokens.add(token)
+        return web.json_response({'token': token, 'expires_in': self.token_lifetime})
+
+    async def manifest(self, request):
+        self.calls['manifest'] += 1
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme != 'Bearer' or token not in self.tokens:
+            raise web.HTTPUnauthorized(headers={'WWW-Authenticate': 'Bearer realm="{}",service="fake"'.format(
+                request.url.with_path('/token').with_query(None)
+            )})
+        tag = request.match_info['tag']
+        index = tag.isdigit() and int(tag)
+        if request.match_info['repository'] != 'app' or index not in self.generations:
+            raise web.HTTPNotFound()
+        return web.Response(headers={
+            'Docker-Content-Digest': manifest_digest(index, self.generations[index]),
+            'Content-Type': 'application/vnd.oci.image.index.v1+json'
+        })
+
+    async def start(self, host, port):
+        self._runner = web.AppRunner(self.create_app())
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--updated', type=float, default=0.1, help="fraction of tags pushed again")
+    args = parser.parse_args()
+
+    async def run():
+        await FakeRegistry(args.updated).start(args.host, args.port)
+        print("Serving the registry on {}:{}".format(args.host, args.port))
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+if __name__ == '__main__':
+    main()
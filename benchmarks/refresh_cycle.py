@@ -0,0 +1,236 @@
+"""Cost of the refresh cycle against a simulated Docker Engine.
+
+Starts benchmarks.fake_engine in a separate process, so its work is not
+counted, and drives a DockerHost with the sensor, binary sensor and switch
+entities on a bare Home Assistant instance. Entities are added directly
+and their state writes go straight to the state machine, so no entity or
+device registry is involved. For each number of containers, reports the
+first (cold) cycle and the median of the following cycles: latency, API
+calls, entity state writes, CPU time, and the peak memory traced over the
+whole run. Run from the repository root with Home Assistant installed:
+
+    python -m benchmarks.refresh_cycle
+    python -m benchmarks.refresh_cycle --sizes 1000 --latency 0.002 --churn 0.01 --json
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+from homeassistant.const import CONF_HOST, CONF_MONITORED_CONDITIONS, CONF_NAME
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity import Entity
+
+from custom_components.docker import DockerHost, binary_sensor, sensor, switch
+from custom_components.docker.api import DockerApi
+from custom_components.docker.const import (
+    CONF_MAX_CONCURRENCY,
+    CONF_USE_EVENTS,
+    CONTAINER_MON_COND,
+    CREATE_SENSORS,
+    DATA_COORDINATOR,
+    DEFAULT_MAX_CONCURRENCY,
+    DOMAIN,
+    RESOURCE_MON_COND
+)
+from custom_components.docker.coordinator import DockerCoordinator
+
+from .fake_engine import serve
+
+SIZES = [10, 100, 1000, 5000]
+PLATFORMS = [('sensor', sensor), ('binary_sensor', binary_sensor), ('switch', switch)]
+
+
+def write_state(entity):
+    """Stand-in for Entity.async_write_ha_state without the registries."""
+    attributes = getattr(entity, 'extra_state_attributes', None) or {}
+    entity.hass.states.async_set(entity.entity_id, str(entity.state), attributes)
+
+
+class Entities:
+    """Collects the entities of the platforms, as an entity platform would."""
+
+    def __init__(self, hass):
+        self.hass = hass
+        self.entities = []
+        self._pending = []
+
+    def add(self, domain, entities, update_before_add=False):
+        for entity in entities:
+            entity.hass = self.hass
+            entity.entity_id = '{}.bench_{}'.format(domain, len(self.entities))
+            self.entities.append(entity)
+            self._pending.append(self._async_add(entity, update_before_add))
+
+    async def _async_add(self, entity, update_before_add):
+        if update_before_add:
+            await entity.async_update()
+        await entity.async_added_to_hass()
+        write_state(entity)
+
+    async def async_wait(self):
+        pending, self._pending = self._pending, []
+        await asyncio.gather(*pending)
+
+
+async def async_create_hass(config_dir):
+    try:
+        hass = HomeAssistant(config_dir)
+    except TypeError:
+        # Before the config directory became an argument
+        hass = HomeAssistant()
+        hass.config.config_dir = config_dir
+    return hass
+
+
+async def async_start_engine(path, count, args):
+    """Start the fake engine in a process of its own and wait for its socket."""
+    process = multiprocessing.get_context('spawn').Process(
+        target=serve,
+        args=(path, count, args.latency, args.churn, args.event_interval, args.stats_interval),
+        daemon=True
+    )
+    process.start()
+    deadline = time.monotonic() + 30
+    while not os.path.exists(path):
+        if time.monotonic() > deadline or not process.is_alive():
+            raise RuntimeError("Fake engine did not start")
+        await asyncio.sleep(0.05)
+    return process
+
+
+class Sample:
+    """Resource usage between two points of a run."""
+
+    def __init__(self, host):
+        self.host = host
+        self._start = self._read()
+
+    def _read(self):
+        return (
+            time.perf_counter(),
+            time.process_time(),
+            sum(self.host.api.calls.values()),
+            self.host.metrics.entity_writes
+        )
+
+    def stop(self):
+        end = self._read()
+        latency, cpu, calls, writes = [b - a for a, b in zip(self._start, end)]
+        return {'latency': latency, 'cpu': cpu, 'api_calls': calls, 'writes': writes}
+
+
+async def async_run(count, args, trace=False):
+    """Run the cycles of one host with count containers."""
+    with tempfile.TemporaryDirectory() as config_dir:
+        path = os.path.join(config_dir, 'docker.sock')
+        engine = await async_start_engine(path, count, args)
+        hass = await async_create_hass(config_dir)
+        hass.data[DATA_COORDINATOR] = DockerCoordinator(hass)
+        conditions = list(CONTAINER_MON_COND) if args.stats else [
+            variable for variable in CONTAINER_MON_COND if variable not in RESOURCE_MON_COND
+        ]
+        entry = SimpleNamespace(
+            entry_id='benchmark',
+            title='Benchmark',
+            data={
+                CONF_NAME: 'Benchmark',
+                CONF_HOST: 'unix://' + path,
+                CONF_MONITORED_CONDITIONS: ','.join(conditions),
+                CREATE_SENSORS: True
+            },
+            options={
+                CONF_USE_EVENTS: args.event_interval is not None,
+                CONF_MAX_CONCURRENCY: args.concurrency
+            }
+        )
+        host = DockerHost(hass, entry)
+        hass.data.setdefault(DOMAIN, {})[entry.entry_id] = host
+        host.api = DockerApi(entry.data[CONF_HOST])
+        host.set_limits()
+        entities = Entities(hass)
+
+        if trace:
+            tracemalloc.start()
+        try:
+            sample = Sample(host)
+            await host.async_update()
+            for domain, platform in PLATFORMS:
+                await platform.async_setup_entry(
+                    hass, entry, lambda new, update=False, domain=domain: entities.add(domain, new, update)
+                )
+            await entities.async_wait()
+            cold = sample.stop()
+            if args.event_interval is not None:
+                host.start_events()
+
+            warm = []
+            for _ in range(args.cycles):
+                sample = Sample(host)
+                await host.async_update()
+                # Let the events and stats streams deliver in between cycles
+                await asyncio.sleep(args.pause)
+                warm.append(sample.stop())
+            peak = tracemalloc.get_traced_memory()[1] if trace else None
+        finally:
+            if trace:
+                tracemalloc.stop()
+            await host.async_stop()
+            engine.terminate()
+            engine.join()
+
+    return {
+        'containers': count,
+        'entities': len(entities.entities),
+        'cold': cold,
+        'warm': {key: statistics.median(sample[key] for sample in warm) for key in cold},
+        'peak_memory': peak
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES)
+    parser.add_argument('--cycles', type=int, default=5, help="warm cycles per size")
+    parser.add_argument('--pause', type=float, default=0.0, help="seconds between cycles")
+    parser.add_argument('--latency', type=float, default=0.0, help="engine seconds per request")
+    parser.add_argument('--churn', type=float, default=0.01, help="fraction changed per list call")
+    parser.add_argument('--event-interval', type=float, default=None, help="follow events generated at this interval")
+    parser.add_argument('--stats', action='store_true', help="follow the stats streams")
+    parser.add_argument('--stats-interval', type=float, default=1.0)
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_MAX_CONCURRENCY)
+    parser.add_argument('--no-memory', action='store_true', help="skip the traced memory run")
+    parser.add_argument('--json', action='store_true', help="print one JSON result per size")
+    args = parser.parse_args()
+
+    # Entities are not added through an entity platform
+    Entity.async_write_ha_state = write_state
+
+    if not args.json:
+        print("{:>6} {:>8} {:>10} {:>10} {:>9} {:>8} {:>9} {:>9}".format(
+            "count", "entities", "cold", "cycle", "calls", "writes", "cpu", "peak"
+        ))
+    for count in args.sizes:
+        result = asyncio.run(async_run(count, args))
+        if not args.no_memory:
+            # Tracing slows everything down, so it has a run of its own
+            result['peak_memory'] = asyncio.run(async_run(count, args, trace=True))['peak_memory']
+        if args.json:
+            print(json.dumps(result))
+            continue
+        warm = result['warm']
+        print("{:>6} {:>8} {:>8.3f} s {:>8.4f} s {:>9.0f} {:>8.0f} {:>7.4f} s {:>9}".format(
+            count, result['entities'], result['cold']['latency'], warm['latency'],
+            warm['api_calls'], warm['writes'], warm['cpu'],
+            '-' if result['peak_memory'] is None else '{:.1f} MB'.format(result['peak_memory'] / 1e6)
+        ))
+
+
+if __name__ == '__main__':
+    main()
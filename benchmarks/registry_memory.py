@@ -0,0 +1,89 @@
+"""Memory footprint of the container registry.
+
+Fills a DockerHost registry with synthetic containers and reports the memory
+it holds, next to the size of the raw inspect documents the registry no
+longer keeps. Run from the repository root with Home Assistant installed:
+
+    python -m benchmarks.registry_memory
+"""
+import gc
+import resource
+import tracemalloc
+from unittest.mock import MagicMock
+
+from custom_components.docker import DockerHost
+
+SIZES = [1000, 10000]
+
+
+def summary(index):
+    """Return a list summary as sent by the Engine API."""
+    return {
+        'Id': '{:064x}'.format(index),
+        'Names': ['/container-{}'.format(index)],
+        'Image': 'registry.example.com/app:{}'.format(index % 20),
+        'ImageID': 'sha256:{:064x}'.format(index % 20),
+        'State': 'running' if index % 3 else 'exited',
+        'Status': 'Up 3 hours',
+        'Created': 1600000000 + index,
+        'Labels': {'com.docker.compose.project': 'stack-{}'.format(index % 50)},
+    }
+
+
+def inspect(index):
+    """Return an inspect document of typical size."""
+    return {
+        'Id': '{:064x}'.format(index),
+        'Name': '/container-{}'.format(index),
+        'Image': 'sha256:{:064x}'.format(index % 20),
+        'State': {'Status': 'running', 'StartedAt': '2020-01-01T00:00:00.000000000Z'},
+        'Config': {
+            'Image': 'registry.example.com/app:{}'.format(index % 20),
+            'Env': ['VARIABLE_{}=value-{}'.format(i, index) for i in range(20)],
+            'Labels': {'label.{}'.format(i): 'value-{}'.format(index) for i in range(10)},
+        },
+        'Mounts': [
+            {'Source': '/data/{}/{}'.format(index, i), 'Destination': '/mnt/{}'.format(i)}
+            for i in range(4)
+        ],
+        'NetworkSettings': {'Networks': {'bridge': {'IPAddress': '172.17.0.2'}}},
+    }
+
+
+def fill(count):
+    """Return a host registry with count containers, as after a full refresh."""
+    host = DockerHost(MagicMock(), MagicMock())
+    host.api = MagicMock()
+    for index in range(count):
+        data = summary(index)
+        container = host.add_container(data['Names'][0].lstrip('/'), data['Id'])
+        container.update_summary(data)
+    return host
+
+
+def measure(factory, count):
+    gc.collect()
+    tracemalloc.start()
+    kept = factory(count)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return size
+
+
+def main():
+    print("{:>8} {:>14} {:>14} {:>12}".format(
+        "count", "registry", "inspect docs", "max rss"
+    ))
+    for count in SIZES:
+        registry = measure(fill, count)
+        documents = measure(lambda n: [inspect(index) for index in range(n)], count)
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        print("{:>8} {:>11.1f} MB {:>11.1f} MB {:>9.1f} MB".format(
+            count, registry / 1e6, documents / 1e6, rss / 1e3
+        ))
+
+
+if __name__ == '__main__':
+    main()
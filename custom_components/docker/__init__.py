@@ -1,40 +1,153 @@
 """ Docker custom component """
+import asyncio
 import logging
-import docker
+import re
+import time
+from collections import Counter, deque
 from datetime import timedelta
+from fnmatch import fnmatchcase
 from dateutil import parser
 
 from typing import Any, Dict
 
+from .api import DockerApi, DockerApiError, DockerConnectionError
+from .cache import DigestCache, ImageCache
+from .coordinator import DockerCoordinator
+from .filters import ContainerFilter, group_of, split
+from .history import MetricHistory, remove as remove_history
+from .logs import LogPatterns, LogWatcher
+from .metrics import CycleMetrics
+from .prometheus import PrometheusExporter, register_view
+from .registry import RegistryClient
+from .stats import StatsTable
 from .const import (
     DOMAIN,
-    DOCKER_CLIENT,
-    DATA_HOST,
-    DATA_VERSION_INFO,
+    DATA_COORDINATOR,
     DATA_UPDATED,
-    CONF_CONTAINERS,
+    DIAGNOSTICS_UPDATED,
+    CONTAINER_UPDATED,
+    CONTAINERS_ADDED,
+    GROUP_UPDATED,
+    GROUPS_ADDED,
+    IMAGE_UPDATED,
+    IMAGES_ADDED,
+    DATA_METRICS_VIEW,
     COMPONENTS,
     PRECISION,
-    DEFAULT_SCAN_INTERVAL,
+    DEFAULT_MIN_INTERVAL,
+    DEFAULT_MAX_INTERVAL,
+    DEFAULT_CYCLE_BUDGET,
+    INTERVAL_GROWTH,
+    INTERVAL_BACKOFF,
+    TRANSITION_WINDOW,
+    TRANSITIONAL_STATES,
+    STOPPED_STATES,
+    DEFAULT_DF_INTERVAL,
+    DEFAULT_UPDATE_CHECKS,
+    UPDATE_CHECK_INTERVAL,
+    DEFAULT_HISTORY,
+    DEFAULT_GROUPS,
+    DEFAULT_PROMETHEUS,
+    HISTORY_FILE,
+    HISTORY_FLUSH_INTERVAL,
+    HISTORY_QUERY_PERIOD,
+    STORAGE_VERSION,
+    STORAGE_KEY,
+    SNAPSHOT_SAVE_DELAY,
+    DEFAULT_LOG_LINES,
+    MAX_STATE_LENGTH,
+    CRASH_LOOP_WINDOW,
+    CRASH_LOOP_RESTARTS,
+    DEFAULT_USE_EVENTS,
+    DEFAULT_RECONCILE_INTERVAL,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_TIMEOUT,
+    DEFAULT_DIAGNOSTICS,
+    EVENTS_RETRY_INTERVAL,
+    CONF_USE_EVENTS,
+    CONF_RECONCILE_INTERVAL,
+    CONF_MIN_INTERVAL,
+    CONF_MAX_INTERVAL,
+    CONF_CYCLE_BUDGET,
+    CONF_MAX_CONCURRENCY,
+    CONF_REQUEST_TIMEOUT,
+    CONF_DIAGNOSTICS,
+    CONF_LOG_CONTAINERS,
+    CONF_LOG_PATTERNS,
+    CONF_LOG_LINES,
+    CONF_UPDATE_CHECKS,
+    CONF_HISTORY,
+    CONF_GROUPS,
+    CONF_PROMETHEUS,
+    CONTAINER_EVENTS,
+    CONTAINER_ACTIONS,
+    ATTR_HOST,
+    ATTR_CONTAINERS,
+    ATTR_LABELS,
+    ATTR_TIMEOUT,
+    ATTR_CONTAINER,
+    ATTR_PERIOD,
+    ATTR_METRICS,
+    EVENT_HISTORY_RESULT,
+    SERVICE_QUERY_HISTORY,
+    DEFAULT_STOP_TIMEOUT,
+    EXPECTED_STATUS,
+    CONTAINER_FILTERS,
     CONTAINER_MON_COND,
+    RESOURCE_MON_COND,
     CREATE_SENSORS
 )
 from homeassistant.const import (
+    EVENT_HOMEASSISTANT_STARTED,
+    EVENT_HOMEASSISTANT_STOP,
     CONF_NAME,
     CONF_HOST,
     CONF_MONITORED_CONDITIONS,
     CONF_SCAN_INTERVAL
 )
+import voluptuous as vol
+
+from homeassistant.core import CoreState, callback
+try:
+    from homeassistant.core import SupportsResponse
+except ImportError:
+    # Services cannot respond before Home Assistant 2023.7; the result is sent as an event
+    SupportsResponse = None
 from homeassistant.exceptions import ConfigEntryNotReady
+import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.entity import Entity
 from homeassistant.helpers.typing import ConfigType, HomeAssistantType
 from homeassistant.helpers.event import async_track_time_interval
+from homeassistant.helpers.storage import STORAGE_DIR, Store
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers import device_registry
 from homeassistant.helpers.dispatcher import async_dispatcher_send
 from homeassistant.util import slugify as util_slugify
 import homeassistant.util.dt as dt_util
 
 _LOGGER = logging.getLogger(__name__)
 
+# Health as shown in the status of the container list, e.g. "Up 2 hours (healthy)"
+SUMMARY_HEALTH = re.compile(r'\((healthy|unhealthy|health: starting)\)')
+
+BYTES_PER_MB = 1000 * 1000
+
+CONTAINER_ACTION_SCHEMA = vol.All(
+    vol.Schema({
+        vol.Optional(ATTR_HOST): cv.string,
+        vol.Optional(ATTR_CONTAINERS): vol.All(cv.ensure_list, [cv.string]),
+        vol.Optional(ATTR_LABELS): vol.All(cv.ensure_list, [cv.string]),
+        vol.Optional(ATTR_TIMEOUT, default=DEFAULT_STOP_TIMEOUT): cv.positive_int
+    }),
+    cv.has_at_least_one_key(ATTR_CONTAINERS, ATTR_LABELS)
+)
+
+QUERY_HISTORY_SCHEMA = vol.Schema({
+    vol.Optional(ATTR_HOST): cv.string,
+    vol.Required(ATTR_CONTAINER): cv.string,
+    vol.Optional(ATTR_PERIOD, default=timedelta(seconds=HISTORY_QUERY_PERIOD)): cv.time_period
+})
+
 async def async_setup(hass: HomeAssistantType, config_entry: ConfigType) -> bool:
     """Configure Docker using config flow only."""
     if DOMAIN in config_entry:
@@ -44,52 +157,215 @@ async def async_setup(hass: HomeAssistantType, config_entry: ConfigType) -> bool
                     DOMAIN, context={"source": SOURCE_IMPORT}, data=entry
                 )
             )
+
+    async def async_container_action(call):
+        """Run a container action on the selected containers of every host."""
+        hosts = [
+            host for host in hass.data.get(DOMAIN, {}).values()
+            if call.data.get(ATTR_HOST) in (None, host.config_entry.data[CONF_NAME])
+        ]
+        for name in call.data.get(ATTR_CONTAINERS, []):
+            # Each host only acts on its own containers
+            if all(host.get_container(name) is None for host in hosts):
+                _LOGGER.warning("Container {} not found".format(name))
+        await asyncio.gather(*[
+            host.async_container_action(
+                call.service,
+                names=call.data.get(ATTR_CONTAINERS, []),
+                labels=call.data.get(ATTR_LABELS, []),
+                timeout=call.data[ATTR_TIMEOUT]
+            ) for host in hosts
+        ])
+
+    for action in CONTAINER_ACTIONS:
+        hass.services.async_register(
+            DOMAIN, action, async_container_action, schema=CONTAINER_ACTION_SCHEMA
+        )
+
+    async def async_query_history(call):
+        """Return the minimum, maximum and mean metrics of a container over a period."""
+        end = dt_util.utcnow()
+        start = end - call.data[ATTR_PERIOD]
+        result = {
+            ATTR_HOST: call.data.get(ATTR_HOST),
+            ATTR_CONTAINER: call.data[ATTR_CONTAINER],
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            ATTR_METRICS: None
+        }
+        for host in hass.data.get(DOMAIN, {}).values():
+            if host.history is None or call.data.get(ATTR_HOST) not in (None, host.config_entry.data[CONF_NAME]):
+                continue
+            metrics = await hass.async_add_executor_job(
+                host.history.query, call.data[ATTR_CONTAINER], start.timestamp(), end.timestamp()
+            )
+            if metrics is not None:
+                result[ATTR_HOST] = host.config_entry.data[CONF_NAME]
+                result[ATTR_METRICS] = metrics
+                break
+        if SupportsResponse is None:
+            hass.bus.async_fire(EVENT_HISTORY_RESULT, result)
+        return result
+
+    if SupportsResponse is None:
+        hass.services.async_register(
+            DOMAIN, SERVICE_QUERY_HISTORY, async_query_history, schema=QUERY_HISTORY_SCHEMA
+        )
+    else:
+        hass.services.async_register(
+            DOMAIN, SERVICE_QUERY_HISTORY, async_query_history, schema=QUERY_HISTORY_SCHEMA,
+            supports_response=SupportsResponse.ONLY
+        )
     return True
 
 async def async_setup_entry(hass: HomeAssistantType, config_entry: ConfigType) -> bool:
     """Set up the Docker component."""
+    if DATA_COORDINATOR not in hass.data:
+        hass.data[DATA_COORDINATOR] = DockerCoordinator(hass)
     client = DockerHost(hass, config_entry)
     hass.data.setdefault(DOMAIN, {})[config_entry.entry_id] = client
-    if not await client.async_setup():
-        return False
-
-    return True
+    if client.exporter is not None and DATA_METRICS_VIEW not in hass.data:
+        # http is only an after dependency, so it may not be set up
+        if 'http' not in hass.config.components:
+            _LOGGER.warning("The HTTP component is not loaded, Prometheus metrics are not served")
+        else:
+            # Views cannot be unregistered; it serves whichever hosts have an exporter
+            register_view(hass)
+            hass.data[DATA_METRICS_VIEW] = True
+    try:
+        if await client.async_setup():
+            return True
+    except ConfigEntryNotReady:
+        hass.data[DOMAIN].pop(config_entry.entry_id, None)
+        raise
+    hass.data[DOMAIN].pop(config_entry.entry_id, None)
+    return False
 
 
 async def async_unload_entry(hass: HomeAssistantType, config_entry: ConfigType) -> bool:
     """Unload Docker config entry."""
-    hass.config_entries.async_forward_entry_unload(config_entry, 'switch')
-    hass.config_entries.async_forward_entry_unload(config_entry, 'sensor')
-    hass.data[DOCKER_CLIENT] = {}
+    for component in COMPONENTS:
+        await hass.config_entries.async_forward_entry_unload(config_entry, component)
+    client = hass.data.get(DOMAIN, {}).pop(config_entry.entry_id, None)
+    if client is not None:
+        await client.async_stop()
     return True
 
+
+async def async_remove_entry(hass: HomeAssistantType, config_entry: ConfigType) -> None:
+    """Remove the snapshot and metric history of a removed Docker config entry."""
+    await Store(hass, STORAGE_VERSION, STORAGE_KEY.format(config_entry.entry_id)).async_remove()
+    await hass.async_add_executor_job(
+        remove_history, hass.config.path(STORAGE_DIR, HISTORY_FILE.format(config_entry.entry_id))
+    )
+
 class DockerHost:
     def __init__(self, hass: HomeAssistantType, config_entry: ConfigType):
         self.hass = hass
         self.config_entry = config_entry
         self.api = None
-        self.unsub_timer = None
+        self.coordinator = hass.data[DATA_COORDINATOR]
+        self.version_info = {}
+        self._version_fetched = False
+        self.disk_usage = {}
+        self.status_counts = Counter()
+        self.updating = False
+        self.last_update = None
+        self.update_duration = None
+        self.scan_interval = None
+        self._transition_until = 0
         self.containers = {}
+        self._names = {}
+        self._events_task = None
+        self._semaphore = None
+        self._action_semaphore = None
+        self._stats_tasks = {}
+        self._log_tasks = {}
+        self.unsub_stats_timer = None
+        self.unsub_df_timer = None
+        self.unsub_update_timer = None
+        self.stats = StatsTable()
+        self.images = ImageCache()
+        self.update_checks = config_entry.options.get(CONF_UPDATE_CHECKS, DEFAULT_UPDATE_CHECKS)
+        self.registry = None
+        self.digests = DigestCache()
+        self.image_updates = None
+        self.image_states = {}
+        self._published_images = set()
+        self._checking_updates = False
+        self.history_enabled = config_entry.options.get(CONF_HISTORY, DEFAULT_HISTORY)
+        self.history = None
+        self.unsub_history_timer = None
+        self.groups_enabled = config_entry.options.get(CONF_GROUPS, DEFAULT_GROUPS)
+        self.groups = {}
+        self._published_groups = set()
+        self.exporter = None
+        if config_entry.options.get(CONF_PROMETHEUS, DEFAULT_PROMETHEUS):
+            self.exporter = PrometheusExporter(self)
+        self.metrics = CycleMetrics()
+        self.diagnostics = config_entry.options.get(CONF_DIAGNOSTICS, DEFAULT_DIAGNOSTICS)
+        self.diagnostics_info = {}
+        self.filter = ContainerFilter.from_entry(config_entry)
+        self.log_containers = []
+        self.log_patterns = None
+        self.set_log_options()
+        self.dirty = set()
+        self._host_dirty = True
+        self._added = set()
+        self._removed = set()
+        self._published = set()
+        self.unsub_listeners = []
+        self.restored = False
+        self._store = None
+        self._save_pending = False
+        self._unsub_start = None
+        self._unsub_stop = None
+        self._stopping = False
+        self._orphans_checked = False
 
     async def async_setup(self):
-        """Set up the Docker client."""
-        try:
-            self.api = docker.DockerClient(base_url=self.config_entry.data[CONF_HOST])
-            _LOGGER.debug("Successfully connected to Docker")
-        except Exception as e:
-            _LOGGER.error("Can not connect to Docker ({})".format(e))
-            raise ConfigEntryNotReady
-
-        self.hass.data[DOCKER_CLIENT] = {}
-        self.hass.data[DOCKER_CLIENT][DATA_HOST] = self
-        self.hass.data[DOCKER_CLIENT][CONF_CONTAINERS] = []
+        """Set up the Docker client.
 
+        With a snapshot of the last known state, the entities are created
+        from it right away, and the live state follows in the background
+        once Home Assistant has started. Without one, the first refresh
+        completes before the entities are created.
+        """
         self.add_options()
-        self.set_scan_interval(self.config_entry.options[CONF_SCAN_INTERVAL])
-        self.config_entry.add_update_listener(self.async_options_updated)
+        self.api = DockerApi(self.config_entry.data[CONF_HOST])
+        self.api.breaker.on_change = self.async_availability_changed
+        self.set_limits()
+        self._store = Store(self.hass, STORAGE_VERSION, STORAGE_KEY.format(self.config_entry.entry_id))
+
+        if await self.async_restore():
+            if self.hass.state == CoreState.running:
+                self.hass.async_create_task(self.async_start())
+            else:
+                self._unsub_start = self.hass.bus.async_listen_once(
+                    EVENT_HOMEASSISTANT_STARTED, self.async_start
+                )
+        else:
+            try:
+                self.set_version_info(await self.api.version())
+                _LOGGER.debug("Successfully connected to Docker")
+            except DockerApiError as e:
+                _LOGGER.error("Can not connect to Docker ({})".format(e))
+                await self.api.close()
+                raise ConfigEntryNotReady
+            await self.async_start()
+        # Only once the setup cannot fail anymore, as nothing removes them otherwise
+        self.config_entry.async_on_unload(
+            self.config_entry.add_update_listener(self.async_options_updated)
+        )
+        self._unsub_stop = self.hass.bus.async_listen_once(
+            EVENT_HOMEASSISTANT_STOP, self._async_hass_stopping
+        )
+        self.config_entry.async_on_unload(self._async_remove_stop_listener)
+        if self.history_enabled and self.monitor_resources:
+            await self.async_open_history()
+        if self.exporter is not None:
+            self.exporter.update(list(self._names), True)
 
-        await self.async_update()
-        
         for component in COMPONENTS:
             self.hass.async_create_task(
                 self.hass.config_entries.async_forward_entry_setup(self.config_entry, component)
@@ -97,114 +373,1144 @@ class DockerHost:
 
         return True
 
+    async def async_open_history(self):
+        """Map the metric history file, and flush it to disk on a schedule."""
+        history = MetricHistory(
+            self.hass.config.path(STORAGE_DIR, HISTORY_FILE.format(self.config_entry.entry_id))
+        )
+        try:
+            await self.hass.async_add_executor_job(history.open)
+        except (OSError, ValueError) as e:
+            _LOGGER.error("Cannot open the Docker metric history ({})".format(e))
+            return
+        self.history = history
+        self.unsub_history_timer = async_track_time_interval(
+            self.hass, self.async_flush_history, timedelta(seconds=HISTORY_FLUSH_INTERVAL)
+        )
+
+    async def async_flush_history(self, event_time=None):
+        await self.hass.async_add_executor_job(self.history.flush)
+
+    async def async_start(self, event=None):
+        """Start the refresh cycles, the events stream and the disk usage updates."""
+        self._unsub_start = None
+        await self.async_update()
+
+        self.set_scan_interval(self.get_scan_interval())
+        self.hass.async_create_task(self.async_update_disk_usage())
+        self.unsub_df_timer = async_track_time_interval(
+            self.hass, self.async_update_disk_usage, timedelta(seconds=DEFAULT_DF_INTERVAL)
+        )
+        if self.update_checks:
+            self.registry = RegistryClient(async_get_clientsession(self.hass))
+            self.hass.async_create_task(self.async_check_image_updates())
+            self.unsub_update_timer = async_track_time_interval(
+                self.hass, self.async_check_image_updates, timedelta(seconds=UPDATE_CHECK_INTERVAL)
+            )
+        if self.config_entry.options.get(CONF_USE_EVENTS, DEFAULT_USE_EVENTS):
+            self.start_events()
+
+    async def async_restore(self) -> bool:
+        """Fill the registry from the snapshot; returns False if there is none."""
+        try:
+            data = await self._store.async_load()
+        except Exception as e:
+            _LOGGER.warning("Cannot load Docker snapshot ({})".format(e))
+            return False
+        if not data:
+            return False
+        self.version_info = data.get('version_info') or {}
+        self.disk_usage = data.get('disk_usage') or {}
+        for item in data.get('containers') or []:
+            self.add_container(item['name'], item['id']).restore(item)
+        self.restored = True
+        # The entities of the restored containers and groups are created with the platforms
+        self.async_publish_containers()
+        if self.groups_enabled:
+            self.async_update_groups()
+        _LOGGER.debug("Restored {} containers".format(len(self.containers)))
+        return True
+
+    @callback
+    def _async_schedule_save(self):
+        if self._store is not None and not self._save_pending:
+            self._save_pending = True
+            self._store.async_delay_save(self._async_snapshot, SNAPSHOT_SAVE_DELAY)
+
+    @callback
+    def _async_snapshot(self):
+        """Return the data to store, when the delayed save is due."""
+        self._save_pending = False
+        return {
+            'version_info': self.version_info,
+            'disk_usage': self.disk_usage,
+            'containers': [container.as_snapshot() for container in self.containers.values()]
+        }
+
     def add_options(self):
         """Add options for Docker integration."""
         if not self.config_entry.options:
-            options = {CONF_SCAN_INTERVAL: DEFAULT_SCAN_INTERVAL}
+            options = {
+                CONF_MIN_INTERVAL: DEFAULT_MIN_INTERVAL,
+                CONF_MAX_INTERVAL: DEFAULT_MAX_INTERVAL,
+                CONF_CYCLE_BUDGET: DEFAULT_CYCLE_BUDGET,
+                CONF_USE_EVENTS: DEFAULT_USE_EVENTS,
+                CONF_RECONCILE_INTERVAL: DEFAULT_RECONCILE_INTERVAL,
+                CONF_MAX_CONCURRENCY: DEFAULT_MAX_CONCURRENCY,
+                CONF_REQUEST_TIMEOUT: DEFAULT_TIMEOUT,
+                CONF_DIAGNOSTICS: DEFAULT_DIAGNOSTICS
+            }
+            for key in CONTAINER_FILTERS:
+                options[key] = self.config_entry.data.get(key, '')
             self.hass.config_entries.async_update_entry(
                 self.config_entry, options=options
             )
 
+    def get_interval_options(self):
+        """Return the minimum and maximum scan interval and the cycle budget."""
+        options = self.config_entry.options
+        minimum = options.get(CONF_MIN_INTERVAL, options.get(CONF_SCAN_INTERVAL, DEFAULT_MIN_INTERVAL))
+        maximum = max(options.get(CONF_MAX_INTERVAL, DEFAULT_MAX_INTERVAL), minimum)
+        return minimum, maximum, options.get(CONF_CYCLE_BUDGET, DEFAULT_CYCLE_BUDGET)
+
+    def get_scan_interval(self):
+        """Return the interval until the next full refresh.
+
+        When the events stream is used, the full list only reconciles missed
+        events and runs at the (much lower) reconcile interval. Otherwise the
+        interval adapts: it backs off while cycles take longer than the
+        budget, drops to the minimum while containers are transitioning and
+        grows towards the maximum while the host is stable.
+        """
+        if not self.available:
+            # Only probe the host once the backoff has elapsed
+            return max(self.api.breaker.retry_in, 1)
+
+        options = self.config_entry.options
+        if options.get(CONF_USE_EVENTS, DEFAULT_USE_EVENTS):
+            return options.get(CONF_RECONCILE_INTERVAL, DEFAULT_RECONCILE_INTERVAL)
+
+        minimum, maximum, budget = self.get_interval_options()
+        interval = self.scan_interval or minimum
+        if self.update_duration is not None and self.update_duration > budget:
+            interval *= INTERVAL_BACKOFF
+        elif self.transitioning:
+            interval = minimum
+        else:
+            interval *= INTERVAL_GROWTH
+        self.scan_interval = min(max(interval, minimum), maximum)
+        return self.scan_interval
+
+    @property
+    def available(self) -> bool:
+        """Return False while the circuit to the host is open."""
+        return self.api is not None and self.api.breaker.closed
+
+    @callback
+    def async_availability_changed(self, available):
+        """Mark all entities (un)available as soon as the host goes down or comes back."""
+        if available:
+            _LOGGER.info("Docker host {} is reachable again".format(self.config_entry.title))
+            self.coordinator.async_schedule(self, 0)
+        else:
+            _LOGGER.warning("Docker host {} is unreachable, retrying in {:.0f} s".format(
+                self.config_entry.title, self.api.breaker.retry_in
+            ))
+        # The stats streams of a dead host can only fail; they restart with it
+        self.sync_streams()
+        self._host_dirty = True
+        self.dirty.update(self._names)
+        self.async_dispatch()
+
+    @property
+    def transitioning(self) -> bool:
+        """Return True while a container is changing state."""
+        if self.hass.loop.time() < self._transition_until:
+            return True
+        return any(container.transitioning for container in self.containers.values())
+
+    @callback
+    def async_container_changing(self):
+        """Refresh at the minimum interval while a container action takes effect."""
+        minimum, _, _ = self.get_interval_options()
+        self._transition_until = self.hass.loop.time() + TRANSITION_WINDOW
+        self.scan_interval = minimum
+        self.coordinator.async_schedule(self, minimum)
+
+    def set_limits(self):
+        """Apply the concurrency limit and request timeout options.
+
+        The connection pool leaves room for the events stream and container
+        actions next to the refreshes; a changed pool size applies once the
+        pool is reopened.
+        """
+        options = self.config_entry.options
+        concurrency = options.get(CONF_MAX_CONCURRENCY, DEFAULT_MAX_CONCURRENCY)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._action_semaphore = asyncio.Semaphore(concurrency)
+        self.api.set_limits(
+            timeout=options.get(CONF_REQUEST_TIMEOUT, DEFAULT_TIMEOUT),
+            limit=concurrency + 2
+        )
+
+    @property
+    def monitor_resources(self) -> bool:
+        """Return True if any resource sensor is created."""
+        data = self.config_entry.data
+        if not data.get(CREATE_SENSORS):
+            return False
+        conditions = data.get(CONF_MONITORED_CONDITIONS, CONTAINER_MON_COND)
+        if type(conditions) is str:
+            conditions = conditions.split(',')
+        return any(variable.strip() in RESOURCE_MON_COND for variable in conditions)
+
     def set_scan_interval(self, scan_interval):
         """Update scan interval."""
-        if self.unsub_timer is not None:
-            self.unsub_timer()
-        self.unsub_timer = async_track_time_interval(
-            self.hass, self.async_update, timedelta(seconds=scan_interval)
-        )
+        self.coordinator.async_schedule(self, scan_interval)
+
+        # Resource metrics arrive continuously from the stats streams. While
+        # the full refresh only reconciles events, publish them separately.
+        if self.unsub_stats_timer is not None:
+            self.unsub_stats_timer()
+            self.unsub_stats_timer = None
+        use_events = self.config_entry.options.get(CONF_USE_EVENTS, DEFAULT_USE_EVENTS)
+        if self.monitor_resources and use_events:
+            stats_interval, _, _ = self.get_interval_options()
+            self.unsub_stats_timer = async_track_time_interval(
+                self.hass, self._async_dispatch_stats, timedelta(seconds=stats_interval)
+            )
+
+    async def _async_dispatch_stats(self, event_time=None) -> None:
+        self.async_dispatch()
     
     @staticmethod
     async def async_options_updated(hass, entry):
         """Triggered by config entry options updates."""
-        hass.data[DOMAIN][entry.entry_id].set_scan_interval(
-            entry.options[CONF_SCAN_INTERVAL]
+        client = hass.data[DOMAIN][entry.entry_id]
+        if (entry.options.get(CONF_DIAGNOSTICS, DEFAULT_DIAGNOSTICS) != client.diagnostics or
+                split(entry.options.get(CONF_LOG_CONTAINERS)) != client.log_containers or
+                entry.options.get(CONF_UPDATE_CHECKS, DEFAULT_UPDATE_CHECKS) != client.update_checks or
+                entry.options.get(CONF_HISTORY, DEFAULT_HISTORY) != client.history_enabled or
+                entry.options.get(CONF_GROUPS, DEFAULT_GROUPS) != client.groups_enabled or
+                entry.options.get(CONF_PROMETHEUS, DEFAULT_PROMETHEUS) != (client.exporter is not None)):
+            # The diagnostic, log, update and group entities are added or removed by reloading,
+            # and the history file and metrics exporter opened or closed
+            hass.async_create_task(hass.config_entries.async_reload(entry.entry_id))
+            return
+        client.set_limits()
+        client.set_log_options()
+        client.filter = ContainerFilter.from_entry(entry)
+        client.scan_interval = None
+        client.set_scan_interval(client.get_scan_interval())
+        client.stop_events()
+        if entry.options.get(CONF_USE_EVENTS, DEFAULT_USE_EVENTS):
+            client.start_events()
+        # Reconcile the registry with the (possibly changed) filters right away
+        client.coordinator.async_schedule(client, 0)
+
+    def set_log_options(self):
+        """Apply the containers to follow the logs of, and the patterns to match."""
+        options = self.config_entry.options
+        self.log_containers = split(options.get(CONF_LOG_CONTAINERS))
+        # Regular expressions may well contain commas
+        self.log_patterns = LogPatterns(split(options.get(CONF_LOG_PATTERNS), ';'))
+
+    def follows_logs(self, name) -> bool:
+        """Return True if the logs of a container are followed."""
+        return any(fnmatchcase(name, pattern) for pattern in self.log_containers)
+
+    async def async_stop(self):
+        """Stop polling and the events stream, and close the connection pool."""
+        self.coordinator.async_unschedule(self)
+        if self._unsub_start is not None:
+            self._unsub_start()
+            self._unsub_start = None
+        for unsub in self.unsub_listeners:
+            unsub()
+        self.unsub_listeners = []
+        if self.unsub_stats_timer is not None:
+            self.unsub_stats_timer()
+            self.unsub_stats_timer = None
+        if self.unsub_df_timer is not None:
+            self.unsub_df_timer()
+            self.unsub_df_timer = None
+        if self.unsub_update_timer is not None:
+            self.unsub_update_timer()
+            self.unsub_update_timer = None
+        if self.unsub_history_timer is not None:
+            self.unsub_history_timer()
+            self.unsub_history_timer = None
+        self.stop_events()
+        self.stop_stats_streams()
+        self.stop_log_streams()
+        if self.history is not None:
+            await self.hass.async_add_executor_job(self.history.close)
+            self.history = None
+        await self.api.close()
+
+    @callback
+    def _async_remove_stop_listener(self):
+        # A fired listener is already gone
+        if self._unsub_stop is not None:
+            self._unsub_stop()
+            self._unsub_stop = None
+
+    @callback
+    def _async_hass_stopping(self, event):
+        """Cancel the endless streams, which the shutdown would otherwise wait for."""
+        self._unsub_stop = None
+        # No streams are started again by the refreshes until the end
+        self._stopping = True
+        self.stop_events()
+        self.stop_stats_streams()
+        self.stop_log_streams()
+
+    def create_background_task(self, target, name):
+        """Run a coroutine that never ends on its own, without Home Assistant waiting for it."""
+        if hasattr(self.hass, 'async_create_background_task'):
+            return self.hass.async_create_background_task(target, name)
+        # Before Home Assistant 2023.3 plain tasks are not tracked
+        return self.hass.loop.create_task(target)
+
+    def start_events(self):
+        """Start following the Docker events stream."""
+        if self._events_task is not None and not self._events_task.done():
+            return
+        self._events_task = self.create_background_task(
+            self._async_watch_events(), 'docker events {}'.format(self.config_entry.entry_id)
+        )
+
+    def stop_events(self):
+        """Stop following the Docker events stream."""
+        if self._events_task is not None:
+            self._events_task.cancel()
+            self._events_task = None
+
+    async def _async_watch_events(self):
+        """Follow the events stream and patch the affected containers.
+
+        On errors the stream is reopened after a short delay with a full
+        reconciliation, so no events are lost in between.
+        """
+        while True:
+            try:
+                _LOGGER.debug("Listening for Docker events")
+                async for event in self.api.events(filters={
+                    'type': ['container'],
+                    'event': CONTAINER_EVENTS,
+                    **self.filter.event_filters
+                }):
+                    self.hass.async_create_task(self.async_handle_event(event))
+            except DockerConnectionError as e:
+                _LOGGER.debug("Docker events stream failed ({})".format(e))
+            except DockerApiError as e:
+                _LOGGER.error("Docker events stream failed ({})".format(e))
+            await asyncio.sleep(max(EVENTS_RETRY_INTERVAL, self.api.breaker.retry_in))
+            await self.async_update()
+
+    async def async_handle_event(self, event):
+        """Patch the container affected by a Docker event."""
+        action = event.get('Action', event.get('status', ''))
+        actor = event.get('Actor', {})
+        container_id = actor.get('ID', event.get('id'))
+        attributes = actor.get('Attributes', {})
+        name = attributes.get('name')
+        if container_id is None or name is None:
+            return
+
+        # Container labels are part of the event attributes
+        if not self.filter.matches(name, attributes):
+            self.remove_container(container_id)
+        elif action == 'destroy':
+            self.remove_container(container_id)
+        elif action == 'rename':
+            if container_id in self.containers:
+                self.rename_container(self.containers[container_id], name)
+        else:
+            try:
+                await self.async_update_container(name, container_id)
+            except DockerApiError as e:
+                _LOGGER.error("Cannot update container {} ({})".format(name, e))
+                return
+            container = self.containers.get(container_id)
+            if container is not None and not self.filter.matches(name, attributes, container.status):
+                self.remove_container(container_id)
+
+        self.sync_streams()
+        self.async_dispatch()
+
+    @callback
+    def async_dispatch(self):
+        """Notify the entities of the host and containers that changed.
+
+        Each container has its own signal, so only the entities of containers
+        in the dirty set (including those with new resource metrics) update.
+        Containers that appeared since the last dispatch are announced to the
+        platforms, which add their entities, and the devices of containers
+        that disappeared are removed with their entities.
+        """
+        if self.dirty:
+            # Resource metrics are not part of the snapshot
+            self._async_schedule_save()
+        changed = self.stats.compute()
+        if changed:
+            # The host totals changed with them
+            self._host_dirty = True
+        if self.history is None:
+            self.dirty.update(container.name for container in changed)
+        else:
+            # Every sample goes to the history, the entities only get the minute means
+            owners, values = self.stats.get_computed()
+            names = [container.name for container in owners]
+            self.dirty.update(self.history.append(dt_util.utcnow().timestamp(), names, values))
+            # Containers the history has no key for show the live values
+            self.dirty.update(name for name in names if not self.history.tracks(name))
+        if self.registry is not None and self.dirty:
+            # A container may have been recreated from a newer image
+            self.count_image_updates()
+        entry_id = self.config_entry.entry_id
+        if self.groups_enabled and (self.dirty or changed):
+            self.async_update_groups()
+        self.async_publish_containers()
+        if self.exporter is not None:
+            self.exporter.update(self.dirty, self._host_dirty)
+        for name in self.dirty:
+            async_dispatcher_send(self.hass, CONTAINER_UPDATED.format(entry_id, name))
+        self.dirty.clear()
+
+        if self._host_dirty:
+            self._host_dirty = False
+            async_dispatcher_send(self.hass, DATA_UPDATED.format(entry_id))
+
+    @callback
+    def async_publish_containers(self):
+        """Add and retire the entities of containers that came and went.
+
+        A container that is destroyed and recreated under the same name
+        between two dispatches keeps its entities.
+        """
+        added = [name for name in self._added if name in self._names and name not in self._published]
+        removed = [name for name in self._removed if name not in self._names and name in self._published]
+        destroyed = [name for name in self._removed if name not in self._names]
+        if self.exporter is not None:
+            # The removed names leave the dirty set below, so they are never rendered again
+            self.exporter.remove(destroyed)
+        if self.history is not None:
+            self.history.release(destroyed)
+        self._added.clear()
+        self._removed.clear()
+        if removed:
+            self._published.difference_update(removed)
+            self.dirty.difference_update(removed)
+            registry = device_registry.async_get(self.hass)
+            for name in removed:
+                _LOGGER.debug("Removing entities of container: {}".format(name))
+                self._remove_device(registry, name)
+        if added:
+            self._published.update(added)
+            async_dispatcher_send(
+                self.hass, CONTAINERS_ADDED.format(self.config_entry.entry_id), added
+            )
+
+    @callback
+    def async_update_groups(self):
+        """Aggregate the containers per compose project or swarm service.
+
+        The members are collected in a single pass over the registry, and
+        the metrics of each group summed over their stats slots in one go.
+        Only the groups whose aggregate changed are notified, and the groups
+        that appeared are announced to the platforms.
+        """
+        members = {}
+        for container in self.containers.values():
+            if container.group:
+                members.setdefault(container.group, []).append(container)
+        groups = {}
+        for group, containers in members.items():
+            sums = self.stats.get_sums(
+                [container.stats_slot for container in containers if container.stats_slot is not None]
+            )
+            groups[group] = {
+                'containers': len(containers),
+                'running': sum(1 for container in containers if container.state),
+                'cpu_percent': sums['container_cpu_percent'],
+                'memory_usage': sums['container_memory_usage'],
+                'members': sorted(container.name for container in containers)
+            }
+        entry_id = self.config_entry.entry_id
+        previous, self.groups = self.groups, groups
+        # Groups that are gone keep their entities, with no members
+        for group in set(previous) | set(groups):
+            if previous.get(group) != groups.get(group):
+                async_dispatcher_send(self.hass, GROUP_UPDATED.format(entry_id, group))
+        added = [group for group in groups if group not in self._published_groups]
+        if added:
+            self._published_groups.update(added)
+            async_dispatcher_send(self.hass, GROUPS_ADDED.format(entry_id), added)
+
+    def _remove_device(self, registry, name):
+        device = registry.async_get_device(
+            identifiers={(DOMAIN, self.config_entry.data[CONF_NAME], name)}
         )
+        if device is not None:
+            # The entity registry removes the entities of the device with it
+            registry.async_remove_device(device.id)
+
+    @callback
+    def async_remove_orphans(self):
+        """Remove the devices of containers that disappeared while not monitored."""
+        registry = device_registry.async_get(self.hass)
+        clientname = self.config_entry.data[CONF_NAME]
+        for device in device_registry.async_entries_for_config_entry(
+            registry, self.config_entry.entry_id
+        ):
+            for identifier in device.identifiers:
+                if (len(identifier) == 3 and identifier[:2] == (DOMAIN, clientname)
+                        and identifier[2] not in self._names):
+                    _LOGGER.debug("Removing orphaned container: {}".format(identifier[2]))
+                    registry.async_remove_device(device.id)
+                    break
 
     async def async_update(self, event_time=None) -> None:
         """Get the latest data from the Docker REST API."""
-        if self.hass.data[DOCKER_CLIENT] == {}:
-            self.unsub_timer = None
+        if not self.api.breaker.ready:
+            # The host is down and not due for a probe yet
             return
+        self.updating = True
+        self.metrics.start_cycle()
+        start = self.hass.loop.time()
         try:
-            await self.hass.async_add_executor_job(self.update_host_info)
-            await self.hass.async_add_executor_job(self.update_containers)
-            async_dispatcher_send(self.hass, DATA_UPDATED)
+            await self.async_update_host_info()
+            await self.async_update_containers()
             _LOGGER.debug("Docker data updated")
+            if self.restored:
+                # All entities show live data from now on
+                self.restored = False
+                self._host_dirty = True
+                self.dirty.update(self._names)
+        except DockerConnectionError as e:
+            # Reported once, as the host becomes unavailable
+            _LOGGER.debug("Unable to reach Docker ({})".format(e))
+            self.metrics.count_error()
+            self._version_fetched = False
         except Exception as e:
             _LOGGER.error("Unable to fetch data from Docker ({})".format(e))
+            self.metrics.count_error()
+            # The daemon may come back upgraded
+            self._version_fetched = False
+        finally:
+            self.updating = False
+            self.last_update = dt_util.utcnow()
+            duration = round(self.hass.loop.time() - start, PRECISION)
+            if duration != self.update_duration:
+                self.update_duration = duration
+                self._host_dirty = True
+        with self.metrics.phase('dispatch'):
+            self.async_dispatch()
 
-    def update_host_info(self) -> None:
+        if self.diagnostics:
+            self.diagnostics_info = self.metrics.get_info(self.api)
+            async_dispatcher_send(self.hass, DIAGNOSTICS_UPDATED.format(self.config_entry.entry_id))
+
+    async def async_update_host_info(self) -> None:
+        """Get the version information, which only changes with the daemon."""
+        if self._version_fetched:
+            return
         try:
-            raw_stats = self.api.version()
-            self.hass.data[DOCKER_CLIENT][DATA_VERSION_INFO] = {
-                'version': raw_stats.get('Version', None),
-                'api_version': raw_stats.get('ApiVersion', None),
-                'os': raw_stats.get('Os', None),
-                'arch': raw_stats.get('Arch', None),
-                'kernel': raw_stats.get('KernelVersion', None),
-            }
-        except Exception as e:
+            with self.metrics.phase('version'):
+                self.set_version_info(await self.api.version())
+        except DockerConnectionError:
+            raise
+        except DockerApiError as e:
             _LOGGER.error("Cannot get Docker version ({})".format(e))
 
-    def update_containers(self) -> None:
+    def set_version_info(self, raw_stats):
+        info = {
+            'version': raw_stats.get('Version', None),
+            'api_version': raw_stats.get('ApiVersion', None),
+            'os': raw_stats.get('Os', None),
+            'arch': raw_stats.get('Arch', None),
+            'kernel': raw_stats.get('KernelVersion', None),
+        }
+        self._version_fetched = True
+        if info != self.version_info:
+            self.version_info = info
+            self._host_dirty = True
+            self._async_schedule_save()
+
+    async def async_update_disk_usage(self, event_time=None) -> None:
+        """Get the image count and disk usage, on a slow schedule of its own.
+
+        The daemon computes the sizes of all images, containers and volumes
+        for this call, so it is far too expensive for the refresh cycle.
+        """
+        if not self.available:
+            return
+        try:
+            df = await self.api.df()
+        except DockerApiError as e:
+            _LOGGER.error("Cannot get Docker disk usage ({})".format(e))
+            return
+        # Volumes that are not in use report a size of -1
+        volumes = [
+            (volume.get('UsageData') or {}).get('Size', -1) for volume in df.get('Volumes') or []
+        ]
+        usage = {
+            'images': len(df.get('Images') or []),
+            'images_size': round(df.get('LayersSize', 0) / BYTES_PER_MB, PRECISION),
+            'containers_size': round(sum(
+                container.get('SizeRw', 0) for container in df.get('Containers') or []
+            ) / BYTES_PER_MB, PRECISION),
+            'volumes_size': round(sum(size for size in volumes if size > 0) / BYTES_PER_MB, PRECISION),
+            'build_cache_size': round(sum(
+                cache.get('Size', 0) for cache in df.get('BuildCache') or []
+            ) / BYTES_PER_MB, PRECISION)
+        }
+        if usage != self.disk_usage:
+            self.disk_usage = usage
+            self._host_dirty = True
+            self._async_schedule_save()
+            self.async_dispatch()
+
+    async def async_check_image_updates(self, event_time=None) -> None:
+        """Look up the registry digests of the images in use, on a slow schedule of its own.
+
+        The lookups go to the registries rather than the daemon, and each
+        reference is looked up once however many containers use it, and only
+        once its cached digest expired.
+        """
+        if self._checking_updates:
+            return
+        self._checking_updates = True
+        try:
+            references = {container.image for container in self.containers.values()}
+            self.digests.retain(references)
+            changed = await self.digests.async_resolve(self.registry, references)
+        finally:
+            self._checking_updates = False
+        if changed:
+            self.dirty.update(
+                container.name for container in self.containers.values() if container.image in changed
+            )
+            self.async_dispatch()
+
+    @callback
+    def count_image_updates(self):
+        """Work out which image references in use have an update, and count them.
+
+        A reference has an update if any container runs it from an older
+        digest, and is unknown while none of its containers can be compared.
+        Only the references whose state changed are notified, and those that
+        appeared are announced to the platforms. References no longer in use
+        keep their entities, as unknown.
+        """
+        found = {}
+        for container in self.containers.values():
+            if container.image:
+                found.setdefault(container.image, []).append(container.update_available)
+        states = {
+            reference: True if True in values else (False if False in values else None)
+            for reference, values in found.items()
+        }
+        entry_id = self.config_entry.entry_id
+        previous, self.image_states = self.image_states, states
+        for reference in set(previous) | set(states):
+            if previous.get(reference) != states.get(reference):
+                async_dispatcher_send(self.hass, IMAGE_UPDATED.format(entry_id, reference))
+        added = [reference for reference in states if reference not in self._published_images]
+        if added:
+            self._published_images.update(added)
+            async_dispatcher_send(self.hass, IMAGES_ADDED.format(entry_id), added)
+        count = sum(1 for state in states.values() if state)
+        if count != self.image_updates:
+            self.image_updates = count
+            self._host_dirty = True
+
+    @callback
+    def count_status(self, previous, status):
+        """Move a container between the status counts."""
+        if previous:
+            self.status_counts[previous] -= 1
+        if status:
+            self.status_counts[status] += 1
+        self._host_dirty = True
+
+    async def async_update_containers(self) -> None:
+        """Refresh all selected containers from a single list call.
+
+        The list summary already carries the state and image, so the full
+        inspect document is only fetched for containers whose summary changed
+        since the last cycle. Those inspects run concurrently, bounded by the
+        concurrency limit, and a failing or slow container only affects itself.
+        """
         _LOGGER.debug("Updating containers...")
-        for container in self.api.containers.list(all=True) or []:
-            if container.name not in self.containers:
-                _LOGGER.debug("Found container: {}".format(container.name))
-                self.containers[container.name] = DockerContainer(self.hass, self.api, container.name)
-            self.containers[container.name].update_stats()
+        container_ids = set()
+        changed = []
+        with self.metrics.phase('list'):
+            listed = await self.api.containers(all=True, filters=self.filter.api_filters)
+        summaries = [
+            summary for summary in listed or []
+            if self.filter.matches(summary['Names'][0].lstrip('/'), summary.get('Labels'), summary.get('State'))
+        ]
+        image_ids = [summary.get('ImageID') for summary in summaries]
+        # Only the list pass sees every image in use
+        self.images.retain(image_ids)
+        await self.images.async_resolve(self.api, image_ids)
+        for summary in summaries:
+            container_id = summary['Id']
+            name = summary['Names'][0].lstrip('/')
+            container_ids.add(container_id)
+            container = self.containers.get(container_id)
+            if container is None:
+                container = self.add_container(name, container_id)
+            elif container.name != name:
+                self.rename_container(container, name)
+            if container.update_summary(summary):
+                changed.append(container)
+
+        results = await asyncio.gather(
+            *[self._async_refresh_container(container) for container in changed],
+            return_exceptions=True
+        )
+        for container, result in zip(changed, results):
+            if isinstance(result, Exception):
+                _LOGGER.error("Cannot update container {} ({})".format(container.name, result))
+
+        for container_id in set(self.containers) - container_ids:
+            self.remove_container(container_id)
+        if not self._orphans_checked:
+            # Only a list that succeeded tells which containers are gone
+            self._orphans_checked = True
+            self.async_remove_orphans()
+
+        self.sync_streams()
+
+    async def _async_refresh_container(self, container) -> None:
+        queued = time.perf_counter()
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                await container.async_update_stats()
+            finally:
+                self.metrics.add_refresh(start - queued, time.perf_counter() - start)
+
+    async def async_container_action(self, action, names=(), labels=(), timeout=DEFAULT_STOP_TIMEOUT):
+        """Run a container action on containers selected by name or label.
+
+        The expected state is applied and dispatched right away. The actions
+        then run concurrently, bounded by the concurrency limit, and each one
+        is confirmed by refreshing only its own container.
+        """
+        targets = {}
+        for name in names:
+            container = self.get_container(name)
+            if container is not None:
+                targets[container.id] = container
+        if labels:
+            try:
+                for summary in await self.api.containers(all=True, filters={'label': list(labels)}):
+                    if summary['Id'] in self.containers:
+                        targets[summary['Id']] = self.containers[summary['Id']]
+            except DockerApiError as e:
+                _LOGGER.error("Cannot select containers by label ({})".format(e))
+        if not targets:
+            return
+
+        for container in targets.values():
+            container.set_expected_status(action)
+        self.async_container_changing()
+        self.async_dispatch()
+
+        async def async_run(container):
+            async with self._action_semaphore:
+                try:
+                    await container.async_action(action, timeout)
+                except DockerApiError as e:
+                    _LOGGER.error("Cannot {} container {} ({})".format(action, container.name, e))
+            await self._async_refresh_container(container)
+            self.sync_streams()
+            self.async_dispatch()
+
+        await asyncio.gather(*[async_run(container) for container in targets.values()])
+
+    async def async_update_container(self, name, container_id) -> None:
+        """Refresh a single container, e.g. in response to an event."""
+        container = self.containers.get(container_id)
+        if container is None:
+            container = self.add_container(name, container_id)
+        await self._async_refresh_container(container)
+
+    def add_container(self, name, container_id):
+        """Add a container to the registry."""
+        _LOGGER.debug("Found container: {}".format(name))
+        container = DockerContainer(self, name, container_id)
+        self.containers[container_id] = container
+        self._names[name] = container_id
+        self._added.add(name)
+        return container
+
+    def rename_container(self, container, name):
+        """Move a container to its new name."""
+        if self._names.get(container.name) == container.id:
+            del self._names[container.name]
+        self.dirty.add(container.name)
+        self.dirty.add(name)
+        self._removed.add(container.name)
+        self._added.add(name)
+        container.name = name
+        self._names[name] = container.id
+
+    def remove_container(self, container_id):
+        """Evict a destroyed container from the registry."""
+        container = self.containers.pop(container_id, None)
+        if container is None:
+            return
+        _LOGGER.debug("Removed container: {}".format(container.name))
+        self.count_status(container.status, None)
+        self.dirty.add(container.name)
+        self._removed.add(container.name)
+        if self._names.get(container.name) == container_id:
+            del self._names[container.name]
+
+    @callback
+    def sync_streams(self):
+        """Start and stop the stats and log streams to match the registry."""
+        self.sync_stats_streams()
+        self.sync_log_streams()
+
+    @callback
+    def sync_log_streams(self):
+        """Follow the logs of the selected running containers, while the host is up."""
+        if not self.log_containers:
+            return
+        followed = {
+            container.id: container
+            for container in self.containers.values()
+            if container.state and self.follows_logs(container.name)
+        } if self.available and not self._stopping else {}
+        for container_id in set(self._log_tasks) - set(followed):
+            self._log_tasks.pop(container_id).cancel()
+        for container_id, container in followed.items():
+            if container_id not in self._log_tasks:
+                # The lines and counters outlive a restart of the container
+                if container.logs is None:
+                    container.logs = LogWatcher(
+                        container, self.config_entry.options.get(CONF_LOG_LINES, DEFAULT_LOG_LINES)
+                    )
+                self._log_tasks[container_id] = self.create_background_task(
+                    container.logs.async_follow(), 'docker logs {}'.format(container.name)
+                )
 
-        self.hass.data[DOCKER_CLIENT][CONF_CONTAINERS] = list(self.containers.keys())
-        async_dispatcher_send(self.hass, DATA_UPDATED)
+    def stop_log_streams(self):
+        """Stop following the container logs."""
+        for task in self._log_tasks.values():
+            task.cancel()
+        self._log_tasks = {}
+
+    @callback
+    def sync_stats_streams(self):
+        """Follow the stats stream of every running container, and only those, while the host is up."""
+        if not self.monitor_resources:
+            return
+        running = {
+            container.id: container
+            for container in self.containers.values() if container.state
+        } if self.available and not self._stopping else {}
+        for container_id in set(self._stats_tasks) - set(running):
+            self._stats_tasks.pop(container_id).cancel()
+        for container_id, container in running.items():
+            if container_id not in self._stats_tasks:
+                self._stats_tasks[container_id] = self.create_background_task(
+                    self._async_follow_stats(container), 'docker stats {}'.format(container.name)
+                )
+
+    def stop_stats_streams(self):
+        """Stop following the stats streams."""
+        for task in self._stats_tasks.values():
+            task.cancel()
+        self._stats_tasks = {}
+
+    async def _async_follow_stats(self, container):
+        """Store the samples of one long-lived stats stream in the container's slot."""
+        slot = container.stats_slot = self.stats.allocate(container)
+        try:
+            while True:
+                try:
+                    async for sample in self.api.stats(container.id):
+                        self.stats.update(slot, sample, self.hass.loop.time())
+                except DockerApiError as e:
+                    _LOGGER.debug("Stats stream of {} failed ({})".format(container.name, e))
+                await asyncio.sleep(EVENTS_RETRY_INTERVAL)
+        finally:
+            container.stats_slot = None
+            self.stats.release(slot)
+
+    @property
+    def container_names(self):
+        return list(self._names)
+
+    def get_info(self):
+        info = dict(self.version_info)
+        info['update_duration'] = self.update_duration
+        info['containers_running'] = self.status_counts['running']
+        info['containers_paused'] = self.status_counts['paused']
+        info['containers_stopped'] = sum(self.status_counts[status] for status in STOPPED_STATES)
+        totals = self.stats.get_totals()
+        info['cpu_percent'] = totals['container_cpu_percent']
+        info['memory_usage'] = totals['container_memory_usage']
+        info.update(self.disk_usage)
+        info['image_updates'] = self.image_updates
+        return info
 
     def get_container(self, name):
-        return self.containers.get(name, None)
+        return self.containers.get(self._names.get(name), None)
 
 class DockerContainer:
-    def __init__(self, hass, hostApi, name):
-        self.hostApi = hostApi
+    """A container in the registry of a Docker host.
+
+    Only the fields used by the sensors and switches are kept. The list
+    summary and inspect document are dropped as soon as they are applied.
+    """
+
+    __slots__ = (
+        'host', 'stats_slot', 'name', 'id', 'state', '_status', 'uptime',
+        'image', 'image_id', 'group', 'transitioning', 'health', 'restart_count', 'exit_code',
+        'oom_killed', 'tty', 'logs', '_restarts', '_started_at', '_fingerprint'
+    )
+
+    def __init__(self, host, name, container_id):
+        self.host = host
+        self.stats_slot = None
         self.name = name
+        self.id = container_id
         self.state = False
-        self.status = ""
+        self._status = ""
         self.uptime = dt_util.as_local(dt_util.now())
         self.image = ""
-        self.cpu = ""
-        self.memory = ""
-        self.network = ""
-        self.container = hostApi.containers.get(name)
-         
+        self.image_id = None
+        self.group = None
+        self.transitioning = False
+        self.health = None
+        self.restart_count = None
+        self.exit_code = None
+        self.oom_killed = False
+        self.tty = False
+        self.logs = None
+        self._restarts = None
+        self._started_at = None
+        self._fingerprint = None
+
     def get_name(self):
         return self.name
 
+    @property
+    def status(self):
+        return self._status
+
+    @status.setter
+    def status(self, status):
+        # Keep the host counts up to date with each change, instead of recounting.
+        # An inspect may finish after the container was removed, which must not count.
+        if status != self._status:
+            if self.host.containers.get(self.id) is self:
+                self.host.count_status(self._status, status)
+            self._status = status
+
     def get_state(self):
         return self.state
 
-    def update_stats(self):
+    def update_summary(self, summary) -> bool:
+        """Apply a summary from the container list.
+
+        Returns True when the summary changed in a way that needs the full
+        inspect document, i.e. a new container, state, image or health. A
+        container that is reported "Up ... seconds" has (re)started since the
+        last cycle without necessarily changing state, so its start time is
+        refreshed too.
+        """
+        previous = (self.status, self.image)
+        status = summary.get('Status', '')
+        self.status = summary.get('State', self.status)
+        self.state = self.status == "running"
+        self.image_id = summary.get('ImageID', self.image_id)
+        self.image = self.host.images.get(self.image_id, summary.get('Image', self.image))
+        self.group = group_of(summary.get('Labels'))
+        self.transitioning = (
+            self.status in TRANSITIONAL_STATES or
+            'health: starting' in status
+        )
+        if (self.status, self.image) != previous:
+            self.host.dirty.add(self.name)
+        if self._restarts and self._expire_restarts():
+            self.host.dirty.add(self.name)
+
+        match = SUMMARY_HEALTH.search(status)
+        health = match.group(1).replace('health: ', '') if match else None
+        if self._fingerprint != (summary.get('State'), summary.get('ImageID'), health):
+            return True
+        return self.state and 'second' in status
+
+    async def async_update_stats(self):
+        """Fetch the inspect document for this container and apply it.
+
+        Besides the status, start time and image, the health, restart count,
+        exit code and OOM flag all come from this same document.
+        """
         try:
-            self.container.reload()
-        except Exception as e:
-            _LOGGER.error("Cannot get Docker version ({})".format(e))
-        self.status = self.container.attrs['State']['Status']
+            attrs = await self.host.api.inspect_container(self.id)
+        except DockerConnectionError as e:
+            _LOGGER.debug("Cannot inspect container {} ({})".format(self.name, e))
+            return
+        except DockerApiError as e:
+            _LOGGER.error("Cannot inspect container {} ({})".format(self.name, e))
+            return
+        previous = self._get_conditions()
+        state = attrs['State']
+        self.status = state['Status']
         self.state = self.status == "running"
-        up_time = parser.parse(self.container.attrs['State']['StartedAt'])
-        if up_time is not None:
-            self.uptime = dt_util.as_local(up_time).isoformat()
-        self.image = self.container.image.tags[0]
+        # Parsing is only needed when the container (re)started
+        started_at = state['StartedAt']
+        if started_at != self._started_at:
+            up_time = parser.parse(started_at)
+            if up_time is not None:
+                self.uptime = dt_util.as_local(up_time).isoformat()
+            self._started_at = started_at
+        await self.host.images.async_resolve(self.host.api, [attrs['Image']])
+        self.image_id = attrs['Image']
+        self.image = self.host.images.get(self.image_id, attrs['Config']['Image'])
+        self.group = group_of(attrs['Config'].get('Labels'))
+        self.health = (state.get('Health') or {}).get('Status')
+        self.exit_code = state.get('ExitCode')
+        self.oom_killed = bool(state.get('OOMKilled'))
+        self.tty = bool(attrs['Config'].get('Tty'))
+        restart_count = attrs.get('RestartCount', 0)
+        if self.restart_count is not None and restart_count > self.restart_count:
+            self._add_restarts(restart_count - self.restart_count)
+        self.restart_count = restart_count
+        self.transitioning = (
+            self.status in TRANSITIONAL_STATES or
+            self.health == 'starting'
+        )
+        self._fingerprint = (self.status, attrs['Image'], self.health)
+        if self._get_conditions() != previous:
+            self.host.dirty.add(self.name)
 
-    def get_info(self):
-        conditions = list(CONTAINER_MON_COND.keys())
+    def _get_conditions(self):
+        return (
+            self.status, self.uptime, self.image, self.health, self.restart_count,
+            self.exit_code, self.oom_killed, self.recent_restarts
+        )
+
+    def _add_restarts(self, count):
+        """Record restarts by the restart policy, for the crash loop detection."""
+        if self._restarts is None:
+            self._restarts = deque()
+        self._restarts.extend([self.host.hass.loop.time()] * count)
+        self._expire_restarts()
+
+    def _expire_restarts(self) -> bool:
+        """Forget restarts that left the window; returns True if any did."""
+        expired = False
+        horizon = self.host.hass.loop.time() - CRASH_LOOP_WINDOW
+        while self._restarts and self._restarts[0] < horizon:
+            self._restarts.popleft()
+            expired = True
+        return expired
+
+    @property
+    def recent_restarts(self) -> int:
+        """Number of restarts within the crash loop window."""
+        return len(self._restarts) if self._restarts else 0
+
+    @property
+    def crash_loop(self) -> bool:
+        return self.recent_restarts >= CRASH_LOOP_RESTARTS
+
+    @property
+    def update_available(self):
+        """True if the registry has another digest for the tag, None if unknown.
+
+        The image is up to date if it was pulled by the current digest of
+        its tag. Locally built images were never pulled, so are unknown.
+        """
+        digest = self.host.digests.get(self.image)
+        digests = self.host.images.get_digests(self.image_id)
+        if digest is None or not digests:
+            return None
+        return digest not in digests
+
+    def as_snapshot(self):
+        """Return the fields to restore the container from at the next startup."""
         return {
-            conditions[0]: self.status,
-            conditions[1]: self.uptime,
-            conditions[2]: self.image
+            'id': self.id,
+            'name': self.name,
+            'status': self.status,
+            'uptime': self.uptime,
+            'image': self.image,
+            'group': self.group,
+            'health': self.health,
+            'restart_count': self.restart_count,
+            'exit_code': self.exit_code,
+            'oom_killed': self.oom_killed,
+            'tty': self.tty,
+            'started_at': self._started_at,
+            'fingerprint': self._fingerprint
         }
-        
-    def start(self):
-        _LOGGER.info("Starting container {}".format(self.name))
-        self.state = True
-        self.container.start()
-
-    def stop(self, timeout=10):
-        _LOGGER.info("Stopping container {}".format(self.name))
-        self.state = False
-        self.container.stop(timeout=timeout)
\ No newline at end of file
+
+    def restore(self, data):
+        """Apply a snapshot from as_snapshot.
+
+        The fingerprint is restored too, so the first live refresh only
+        inspects the containers that changed in the meantime.
+        """
+        self.status = data.get('status') or ''
+        self.state = self.status == "running"
+        self.uptime = data.get('uptime', self.uptime)
+        self.image = data.get('image') or ''
+        self.group = data.get('group')
+        self.health = data.get('health')
+        self.restart_count = data.get('restart_count')
+        self.exit_code = data.get('exit_code')
+        self.oom_killed = bool(data.get('oom_killed'))
+        self.tty = bool(data.get('tty'))
+        self._started_at = data.get('started_at')
+        fingerprint = data.get('fingerprint')
+        self._fingerprint = tuple(fingerprint) if fingerprint else None
+
+    def get_info(self):
+        info = {
+            'container_status': self.status,
+            'container_uptime': self.uptime,
+            'container_image': self.image,
+            'container_health': self.health,
+            'container_restart_count': self.restart_count,
+            'container_exit_code': self.exit_code,
+            'container_recent_restarts': self.recent_restarts,
+            'container_unhealthy': self.health == 'unhealthy',
+            'container_oom_killed': self.oom_killed,
+            'container_crash_loop': self.crash_loop,
+            'container_update_available': self.update_available,
+            'container_log_matches': self.logs.match_count if self.logs else None,
+            'container_last_log': (self.logs.last_line or '')[:MAX_STATE_LENGTH] if self.logs else None
+        }
+        summary = self.host.history.get_summary(self.name) if self.host.history is not None else None
+        if summary is not None:
+            info.update(summary)
+        else:
+            info.update(self.host.stats.get_info(self.stats_slot))
+        return info
+
+    def set_expected_status(self, action):
+        """Apply the status an action is expected to result in."""
+        previous = self.status
+        self.status = EXPECTED_STATUS[action]
+        self.state = self.status == "running"
+        if self.status != previous:
+            self.host.dirty.add(self.name)
+
+    async def async_action(self, action, timeout=DEFAULT_STOP_TIMEOUT):
+        _LOGGER.info("Running {} on container {}".format(action, self.name))
+        if action in ('stop', 'restart'):
+            await getattr(self.host.api, action)(self.id, timeout=timeout)
+        else:
+            await getattr(self.host.api, action)(self.id)
\ No newline at end of file
@@ -0,0 +1,370 @@
+"""Asynchronous client for the Docker Engine API."""
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+from urllib.parse import urlparse
+
+import aiohttp
+
+from .const import (
+    DEFAULT_TIMEOUT,
+    DEFAULT_CONNECTION_LIMIT,
+    DEFAULT_KEEPALIVE_TIMEOUT,
+    DF_TIMEOUT,
+    CONNECT_TIMEOUT,
+    BREAKER_THRESHOLD,
+    BREAKER_MIN_BACKOFF,
+    BREAKER_MAX_BACKOFF
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+# Endpoints that only fail when the daemon does; a slow inspect or stats
+# request of a single container says nothing about the host
+HOST_ENDPOINTS = ('GET /version', 'GET /containers/json', 'GET /events')
+
+
+class DockerApiError(Exception):
+    """Error returned by, or while talking to, the Docker Engine API."""
+
+
+class DockerConnectionError(DockerApiError):
+    """The Docker Engine could not be reached, or the circuit is open."""
+
+
+def parse_host(host):
+    """Split a Docker host into the HTTP base URL and unix socket path.
+
+    Accepts the same forms as the docker CLI: unix://path, tcp://host:port,
+    http(s)://host:port and a bare host:port.
+    """
+    if host.startswith('unix://'):
+        return 'http://localhost', '/' + host[len('unix://'):].lstrip('/')
+    if host.startswith('/'):
+        return 'http://localhost', host
+    if host.startswith('tcp://'):
+        host = 'http://' + host[len('tcp://'):]
+    elif '://' not in host:
+        host = 'http://' + host
+    url = urlparse(host)
+    return '{}://{}'.format(url.scheme, url.netloc), None
+
+
+class CircuitBreaker:
+    """Stop calling a host that is down, and probe it with exponential backoff.
+
+    The circuit opens after a number of consecutive connection failures, or
+    at once when no connection can be made at all. While open, requests fail
+    immediately without touching the network. Once the backoff has elapsed
+    a single request is let through as a probe: a response of any kind
+    closes the circuit, a failure opens it again for twice as long.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, min_backoff=BREAKER_MIN_BACKOFF,
+                 max_backoff=BREAKER_MAX_BACKOFF):
+        self.threshold = threshold
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.backoff = min_backoff
+        self.failures = 0
+        self.on_change = None
+        self._retry_at = 0
+
+    @property
+    def closed(self) -> bool:
+        return self.failures < self.threshold
+
+    @property
+    def retry_in(self) -> float:
+        """Return the time until the next probe is allowed."""
+        if self.closed:
+            return 0
+        return max(self._retry_at - time.monotonic(), 0)
+
+    @property
+    def ready(self) -> bool:
+        """Return True if a request would be let through."""
+        return self.closed or self.retry_in == 0
+
+    def allow(self) -> bool:
+        """Return True if a request may be sent, claiming the probe if open."""
+        if self.closed:
+            return True
+        if self.retry_in > 0:
+            return False
+        # Hold back other requests while the probe is out; should it never
+        # complete, the next probe is due after the same backoff
+        self._retry_at = time.monotonic() + self.backoff
+        return True
+
+    def record_success(self):
+        was_closed = self.closed
+        self.failures = 0
+        self.backoff = self.min_backoff
+        if not was_closed and self.on_change is not None:
+            self.on_change(True)
+
+    def record_failure(self, unreachable=False):
+        """Count a connection failure; unreachable opens the circuit at once."""
+        was_closed = self.closed
+        self.failures = self.threshold if unreachable else self.failures + 1
+        if self.closed:
+            return
+        if not was_closed:
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+        self._retry_at = time.monotonic() + self.backoff
+        if was_closed and self.on_change is not None:
+            self.on_change(False)
+
+
+def endpoint(method, path):
+    """Return the endpoint of a request, without the ID of the object."""
+    parts = path.strip('/').split('/')
+    if len(parts) == 3:
+        parts[1] = '{id}'
+    return '{} /{}'.format(method, '/'.join(parts))
+
+
+class DockerApi:
+    """Pooled, keep-alive connection to a single Docker Engine."""
+
+    def __init__(self, host, timeout=DEFAULT_TIMEOUT, limit=DEFAULT_CONNECTION_LIMIT):
+        self.host = host
+        self.base_url, self.socket_path = parse_host(host)
+        self.timeout = self._timeout(timeout)
+        self.limit = limit
+        self.breaker = CircuitBreaker()
+        self._session = None
+        self._stream_session = None
+        # Requests and failures per endpoint, for the diagnostics
+        self.calls = Counter()
+        self.errors = Counter()
+
+    def set_limits(self, timeout, limit):
+        """Update the request timeout and the size of the connection pool.
+
+        The timeout applies immediately, the pool size once the pool is
+        (re)created.
+        """
+        self.timeout = self._timeout(timeout)
+        self.limit = limit
+
+    @staticmethod
+    def _timeout(total):
+        """Return a timeout that gives up early on hosts that do not answer at all."""
+        return aiohttp.ClientTimeout(total=total, sock_connect=min(CONNECT_TIMEOUT, total))
+
+    def _create_session(self, limit):
+        if self.socket_path is not None:
+            connector = aiohttp.UnixConnector(
+                path=self.socket_path,
+                limit=limit,
+                keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT
+            )
+        else:
+            connector = aiohttp.TCPConnector(
+                limit=limit,
+                keepalive_timeout=DEFAULT_KEEPALIVE_TIMEOUT
+            )
+        return aiohttp.ClientSession(
+            connector=connector, timeout=self.timeout, raise_for_status=False
+        )
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Return the session, creating the connection pool on first use."""
+        if self._session is None or self._session.closed:
+            self._session = self._create_session(self.limit)
+        return self._session
+
+    @property
+    def stream_session(self) -> aiohttp.ClientSession:
+        """Return the session for long-lived streams.
+
+        Every stream holds its connection for as long as it runs, so streams
+        get their own unbounded pool instead of starving regular requests.
+        """
+        if self._stream_session is None or self._stream_session.closed:
+            self._stream_session = self._create_session(0)
+        return self._stream_session
+
+    async def close(self):
+        """Close all pooled connections."""
+        for session in (self._session, self._stream_session):
+            if session is not None:
+                await session.close()
+        self._session = None
+        self._stream_session = None
+
+    @staticmethod
+    def _params(params):
+        """Encode query parameters the way the Engine API expects them."""
+        encoded = {}
+        for key, value in (params or {}).items():
+            if value is None:
+                continue
+            if isinstance(value, bool):
+                value = '1' if value else '0'
+            elif isinstance(value, dict):
+                value = json.dumps(value)
+            encoded[key] = str(value)
+        return encoded
+
+    async def _request(self, method, path, params=None, timeout=None):
+        """Send a request and return the decoded JSON body, if any."""
+        name = endpoint(method, path)
+        self._check_breaker()
+        self.calls[name] += 1
+        try:
+            async with self.session.request(
+                method,
+                self.base_url + path,
+                params=self._params(params),
+                timeout=timeout or self.timeout
+            ) as response:
+                body = await response.read()
+                self.breaker.record_success()
+                if response.status >= 400:
+                    raise DockerApiError(self._error_message(response.status, body))
+                if not body:
+                    return None
+                return json.loads(body)
+        except DockerApiError:
+            self.errors[name] += 1
+            raise
+        except Exception as e:
+            self.errors[name] += 1
+            raise self._failure(name, "{} {} failed ({})".format(method, path, e), e) from e
+
+    def _check_breaker(self):
+        if not self.breaker.allow():
+            raise DockerConnectionError("{} is unreachable, next attempt in {:.0f} s".format(
+                self.host, self.breaker.retry_in
+            ))
+
+    def _failure(self, name, message, error):
+        """Return the error to raise for a failed request, and feed the breaker.
+
+        Failing to connect at all opens the circuit, whatever the request.
+        Timeouts and dropped connections only count for the host endpoints;
+        for other requests they are errors of the container concerned.
+        """
+        if isinstance(error, aiohttp.ClientConnectorError):
+            self.breaker.record_failure(unreachable=True)
+        elif (isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError, OSError))
+                and name in HOST_ENDPOINTS):
+            self.breaker.record_failure()
+        else:
+            return DockerApiError(message)
+        return DockerConnectionError(message)
+
+    @staticmethod
+    def _error_message(status, body):
+        try:
+            return "{}: {}".format(status, json.loads(body)['message'])
+        except Exception:
+            return "{}: {}".format(status, body[:200])
+
+    async def version(self):
+        return await self._request('GET', '/version')
+
+    async def containers(self, all=True, filters=None):
+        return await self._request('GET', '/containers/json', params={
+            'all': all,
+            'filters': filters
+        })
+
+    async def inspect_container(self, container_id):
+        return await self._request('GET', '/containers/{}/json'.format(container_id))
+
+    async def inspect_image(self, image_id):
+        return await self._request('GET', '/images/{}/json'.format(image_id))
+
+    async def df(self):
+        """Return the disk usage of images, containers, volumes and build cache."""
+        return await self._request(
+            'GET', '/system/df', timeout=self._timeout(DF_TIMEOUT)
+        )
+
+    async def start(self, container_id):
+        await self._request('POST', '/containers/{}/start'.format(container_id))
+
+    async def stop(self, container_id, timeout=10):
+        await self._request(
+            'POST',
+            '/containers/{}/stop'.format(container_id),
+            params={'t': timeout},
+            timeout=self._timeout(timeout + self.timeout.total)
+        )
+
+    async def restart(self, container_id, timeout=10):
+        await self._request(
+            'POST',
+            '/containers/{}/restart'.format(container_id),
+            params={'t': timeout},
+            timeout=self._timeout(timeout + self.timeout.total)
+        )
+
+    async def pause(self, container_id):
+        await self._request('POST', '/containers/{}/pause'.format(container_id))
+
+    async def unpause(self, container_id):
+        await self._request('POST', '/containers/{}/unpause'.format(container_id))
+
+    async def _stream(self, path, params=None):
+        """Yield the JSON documents of a newline delimited stream."""
+        buffer = b''
+        async for chunk in self._raw_stream(path, params):
+            *lines, buffer = (buffer + chunk).split(b'\n')
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError as e:
+                    raise DockerApiError("Stream {} failed ({})".format(path, e)) from e
+
+    async def _raw_stream(self, path, params=None):
+        """Yield the chunks of a streamed response as they arrive."""
+        name = endpoint('GET', path)
+        self._check_breaker()
+        self.calls[name] += 1
+        try:
+            async with self.stream_session.get(
+                self.base_url + path,
+                params=self._params(params),
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=CONNECT_TIMEOUT)
+            ) as response:
+                self.breaker.record_success()
+                if response.status >= 400:
+                    raise DockerApiError(self._error_message(response.status, await response.read()))
+                async for chunk in response.content.iter_any():
+                    yield chunk
+        except DockerApiError:
+            self.errors[name] += 1
+            raise
+        except Exception as e:
+            self.errors[name] += 1
+            raise self._failure(name, "Stream {} failed ({})".format(path, e), e) from e
+
+    def events(self, filters=None):
+        """Yield decoded events from the (endless) events stream."""
+        return self._stream('/events', {'filters': filters})
+
+    def stats(self, container_id):
+        """Yield stats samples of a container, roughly one per second."""
+        return self._stream('/containers/{}/stats'.format(container_id), {'stream': True})
+
+    def logs(self, container_id, since=None):
+        """Yield raw chunks of the followed, timestamped log stream of a container."""
+        return self._raw_stream('/containers/{}/logs'.format(container_id), {
+            'follow': True,
+            'stdout': True,
+            'stderr': True,
+            'timestamps': True,
+            'since': since
+        })
@@ -0,0 +1,166 @@
+"""Support for Docker binary sensors."""
+import logging
+
+from homeassistant.core import callback
+from homeassistant.const import (
+    CONF_MONITORED_CONDITIONS,
+    CONF_NAME
+)
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.helpers.typing import HomeAssistantType
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.components.binary_sensor import BinarySensorEntity
+
+from .entity import DockerHostEntity, DockerContainerEntity
+from .const import (
+    DOMAIN,
+    CONTAINERS_ADDED,
+    CREATE_SENSORS,
+    BINARY_MON_COND,
+    DATA_UPDATED,
+    IMAGE_UPDATED,
+    IMAGES_ADDED
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+async def async_setup_entry(
+    hass: HomeAssistantType, config_entry: ConfigEntry, async_add_entities
+) -> None:
+    """Set up the Docker Binary Sensor."""
+    host = hass.data[DOMAIN][config_entry.entry_id]
+
+    if host.update_checks:
+        def create_image_sensors(references):
+            return [ImageUpdateBinarySensor(
+                hass = hass,
+                api = host,
+                clientname = config_entry.data[CONF_NAME],
+                reference = reference
+            ) for reference in references]
+
+        @callback
+        def async_images_added(references):
+            """Add the update sensors of images that came into use."""
+            async_add_entities(create_image_sensors(references), True)
+
+        host.unsub_listeners.append(async_dispatcher_connect(
+            hass, IMAGES_ADDED.format(config_entry.entry_id), async_images_added
+        ))
+        async_add_entities(create_image_sensors(host.image_states), True)
+
+    if not config_entry.data[CREATE_SENSORS]:
+        return
+
+    conditions = config_entry.data.get(CONF_MONITORED_CONDITIONS) or BINARY_MON_COND
+    if type(conditions) is str:
+        conditions = conditions.split(',')
+
+    def create_sensors(names):
+        sensors = []
+        for container in names:
+            sensors += [ContainerBinarySensor(
+                hass = hass, 
+                api = host, 
+                clientname = config_entry.data[CONF_NAME], 
+                container_name = container, 
+                variable = variable.strip()
+            ) for variable in conditions if variable.strip() in BINARY_MON_COND]
+        return sensors
+
+    @callback
+    def async_containers_added(names):
+        """Add the binary sensors of containers that appeared."""
+        async_add_entities(create_sensors(names), True)
+
+    host.unsub_listeners.append(async_dispatcher_connect(
+        hass, CONTAINERS_ADDED.format(config_entry.entry_id), async_containers_added
+    ))
+    async_add_entities(create_sensors(host.container_names), True)
+
+class ContainerBinarySensor(DockerContainerEntity, BinarySensorEntity):
+    """Representation of a Docker problem condition."""
+
+    def __init__(self, hass, api, clientname, container_name, variable):
+        """Initialize the binary sensor."""
+        super().__init__(hass, api, clientname, container_name)
+        self._var_id = variable
+        self._var_name = BINARY_MON_COND[variable][0]
+        self._var_icon = BINARY_MON_COND[variable][1]
+        self._var_class = BINARY_MON_COND[variable][2]
+        self._state = False
+
+    @property
+    def unique_id(self) -> str:
+        """Return the unique ID for this binary sensor."""
+        return "{}_{}_{}".format(self._clientname, self._container_name, self._var_name)
+
+    @property
+    def name(self):
+        """Return the name of the binary sensor."""
+        return "{} {}".format(self._container_name.title(), self._var_name)
+
+    @property
+    def icon(self):
+        """Icon to use in the frontend."""
+        return self._var_icon
+
+    @property
+    def is_on(self):
+        """Return true if the problem is present."""
+        return self._state
+
+    @property
+    def device_class(self):
+        """Return the class of this binary sensor."""
+        return self._var_class
+
+    def _update_container(self, container):
+        self._state = bool(container.get_info().get(self._var_id))
+
+
+class ImageUpdateBinarySensor(DockerHostEntity, BinarySensorEntity):
+    """Whether an image reference in use has a newer version in its registry.
+
+    There is one per reference, however many containers run it, and it
+    belongs to the host device.
+    """
+
+    def __init__(self, hass, api, clientname, reference):
+        """Initialize the binary sensor."""
+        super().__init__(hass, api, clientname)
+        self._reference = reference
+
+    def _signals(self):
+        entry_id = self._api.config_entry.entry_id
+        # The host signal for the availability of the host
+        return [IMAGE_UPDATED.format(entry_id, self._reference), DATA_UPDATED.format(entry_id)]
+
+    @property
+    def unique_id(self) -> str:
+        """Return the unique ID for this binary sensor."""
+        return "docker_{}_image_{}".format(self._clientname, self._reference)
+
+    @property
+    def name(self):
+        """Return the name of the binary sensor."""
+        return "{} {} Update Available".format(self._clientname, self._reference)
+
+    @property
+    def icon(self):
+        """Icon to use in the frontend."""
+        return 'mdi:package-up'
+
+    @property
+    def is_on(self):
+        """Return true if the image has an update, None while unknown."""
+        return self._state
+
+    @property
+    def device_class(self):
+        """Return the class of this binary sensor."""
+        return 'update'
+
+    def _update_state(self):
+        super()._update_state()
+        self._state = self._api.image_states.get(self._reference)
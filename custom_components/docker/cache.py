@@ -0,0 +1,121 @@
+"""Caches for data that rarely changes between refresh cycles."""
+import asyncio
+import logging
+import time
+
+from .api import DockerApiError
+from .const import IMAGE_ERROR_TTL, DIGEST_TTL, DIGEST_ERROR_TTL
+from .registry import RegistryError, parse_reference
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ImageCache:
+    """Display names and repository digests of images by image ID.
+
+    Each distinct image is inspected once, however many containers use it,
+    and kept until a full list pass finds no container using it. Untagged images are cached
+    too, as an empty name, so they are not inspected again on every cycle.
+    A failed inspect is retried after error_ttl seconds, not on every cycle.
+    """
+
+    def __init__(self, error_ttl=IMAGE_ERROR_TTL):
+        self.error_ttl = error_ttl
+        self._images = {}
+        self._failed = {}
+
+    def __contains__(self, image_id):
+        return image_id in self._images
+
+    def __len__(self):
+        return len(self._images)
+
+    def get(self, image_id, default=None):
+        """Return the first tag of an image, or the default if it has none."""
+        image = self._images.get(image_id)
+        if image is None:
+            return default
+        return image[0] or default
+
+    def get_digests(self, image_id):
+        """Return the manifest digests an image was pulled by, if any."""
+        image = self._images.get(image_id)
+        return image[1] if image is not None else ()
+
+    def retain(self, image_ids):
+        """Forget the images that are no longer in use, given all images in use."""
+        in_use = set(image_ids)
+        for image_id in set(self._images) - in_use:
+            del self._images[image_id]
+        for image_id in set(self._failed) - in_use:
+            del self._failed[image_id]
+
+    async def async_resolve(self, api, image_ids):
+        """Inspect the images that are not cached yet."""
+        now = time.monotonic()
+        for image_id in [image_id for image_id, retry_at in self._failed.items() if retry_at <= now]:
+            del self._failed[image_id]
+        missing = {image_id for image_id in image_ids if image_id} - set(self._images) - set(self._failed)
+        if missing:
+            await asyncio.gather(*[self._async_fetch(api, image_id) for image_id in missing])
+
+    async def _async_fetch(self, api, image_id):
+        try:
+            attrs = await api.inspect_image(image_id)
+        except DockerApiError as e:
+            _LOGGER.debug("Cannot inspect image {} ({})".format(image_id, e))
+            self._failed[image_id] = time.monotonic() + self.error_ttl
+            return
+        tags = [tag for tag in attrs.get('RepoTags') or [] if tag != '<none>:<none>']
+        # Locally built images have no repository digests
+        digests = tuple(digest.partition('@')[2] for digest in attrs.get('RepoDigests') or [])
+        self._images[image_id] = (tags[0] if tags else '', digests)
+
+
+class DigestCache:
+    """Registry digests of image references, each kept for a time to live.
+
+    Each reference is looked up once, however many containers use it, and
+    only again once its digest expired. A failed lookup keeps the last
+    known digest and is retried after a shorter time, so an image that
+    cannot be looked up, e.g. a private one, is not retried on every check.
+    """
+
+    def __init__(self, ttl=DIGEST_TTL, error_ttl=DIGEST_ERROR_TTL):
+        self.ttl = ttl
+        self.error_ttl = error_ttl
+        self._digests = {}
+
+    def __len__(self):
+        return len(self._digests)
+
+    def get(self, reference):
+        """Return the last known registry digest of a reference."""
+        digest = self._digests.get(reference)
+        return digest[0] if digest is not None else None
+
+    def retain(self, references):
+        """Forget the references that are no longer in use."""
+        for reference in set(self._digests) - set(references):
+            del self._digests[reference]
+
+    async def async_resolve(self, client, references):
+        """Look up the expired references; returns those whose digest changed."""
+        now = time.monotonic()
+        missing = [
+            reference for reference in set(references)
+            if parse_reference(reference) and self._digests.get(reference, (None, 0))[1] <= now
+        ]
+        changed = await asyncio.gather(*[self._async_fetch(client, reference) for reference in missing])
+        return {reference for reference, is_changed in zip(missing, changed) if is_changed}
+
+    async def _async_fetch(self, client, reference):
+        previous = self.get(reference)
+        try:
+            digest = await client.digest(*parse_reference(reference))
+            ttl = self.ttl
+        except RegistryError as e:
+            _LOGGER.debug("Cannot look up the digest of {} ({})".format(reference, e))
+            digest, ttl = previous, self.error_ttl
+        self._digests[reference] = (digest, time.monotonic() + ttl)
+        return digest != previous
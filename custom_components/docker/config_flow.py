@@ -6,26 +6,51 @@ from homeassistant.core import callback
 from homeassistant.const import (
     CONF_NAME,
     CONF_HOST,
-    CONF_SCAN_INTERVAL,
     CONF_MONITORED_CONDITIONS
 )
 from .const import (
     DOMAIN,
     DEFAULT_NAME,
     DEFAULT_HOST,
-    DEFAULT_SCAN_INTERVAL,
+    DEFAULT_MIN_INTERVAL,
+    DEFAULT_MAX_INTERVAL,
+    DEFAULT_CYCLE_BUDGET,
     DEFAULT_CREATE_SENSORS,
+    DEFAULT_USE_EVENTS,
+    DEFAULT_RECONCILE_INTERVAL,
+    DEFAULT_MAX_CONCURRENCY,
+    DEFAULT_TIMEOUT,
+    DEFAULT_DIAGNOSTICS,
+    DEFAULT_LOG_LINES,
+    DEFAULT_UPDATE_CHECKS,
+    DEFAULT_HISTORY,
+    DEFAULT_GROUPS,
+    DEFAULT_PROMETHEUS,
     CREATE_SENSORS,
-    HOST_MON_COND,
-    CONTAINER_MON_COND,
-    CONF_CONTAINERS
+    CONF_USE_EVENTS,
+    CONF_RECONCILE_INTERVAL,
+    CONF_MIN_INTERVAL,
+    CONF_MAX_INTERVAL,
+    CONF_CYCLE_BUDGET,
+    CONF_MAX_CONCURRENCY,
+    CONF_REQUEST_TIMEOUT,
+    CONF_DIAGNOSTICS,
+    CONF_LOG_CONTAINERS,
+    CONF_LOG_PATTERNS,
+    CONF_LOG_LINES,
+    CONF_UPDATE_CHECKS,
+    CONF_HISTORY,
+    CONF_GROUPS,
+    CONF_PROMETHEUS,
+    CONTAINER_FILTERS
 )
 
 DATA_SCHEMA = vol.Schema({
     vol.Required(CONF_NAME, default=DEFAULT_NAME): str,
     vol.Required(CONF_HOST, default=DEFAULT_HOST): str,
     vol.Optional(CONF_MONITORED_CONDITIONS): str,
-    vol.Required(CREATE_SENSORS, default=DEFAULT_CREATE_SENSORS): bool
+    vol.Required(CREATE_SENSORS, default=DEFAULT_CREATE_SENSORS): bool,
+    **{vol.Optional(key, default=''): str for key in CONTAINER_FILTERS}
 })
 
 class DockerConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
@@ -71,7 +96,54 @@ class DockerOptionsFlowHandler(config_entries.OptionsFlow):
             return self.async_create_entry(title = "", data = user_input)
 
         return self.async_show_form(step_id="init", data_schema=vol.Schema({
-            vol.Required(CONF_SCAN_INTERVAL, default=self.config_entry.options.get(
-                CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL
-            )): int
+            vol.Required(CONF_MIN_INTERVAL, default=self.config_entry.options.get(
+                CONF_MIN_INTERVAL, DEFAULT_MIN_INTERVAL
+            )): vol.All(int, vol.Range(min=1)),
+            vol.Required(CONF_MAX_INTERVAL, default=self.config_entry.options.get(
+                CONF_MAX_INTERVAL, DEFAULT_MAX_INTERVAL
+            )): vol.All(int, vol.Range(min=1)),
+            vol.Required(CONF_CYCLE_BUDGET, default=self.config_entry.options.get(
+                CONF_CYCLE_BUDGET, DEFAULT_CYCLE_BUDGET
+            )): vol.All(vol.Coerce(float), vol.Range(min=0.1)),
+            vol.Required(CONF_USE_EVENTS, default=self.config_entry.options.get(
+                CONF_USE_EVENTS, DEFAULT_USE_EVENTS
+            )): bool,
+            vol.Required(CONF_RECONCILE_INTERVAL, default=self.config_entry.options.get(
+                CONF_RECONCILE_INTERVAL, DEFAULT_RECONCILE_INTERVAL
+            )): vol.All(vol.Coerce(int), vol.Range(min=1)),
+            vol.Required(CONF_MAX_CONCURRENCY, default=self.config_entry.options.get(
+                CONF_MAX_CONCURRENCY, DEFAULT_MAX_CONCURRENCY
+            )): vol.All(int, vol.Range(min=1)),
+            vol.Required(CONF_REQUEST_TIMEOUT, default=self.config_entry.options.get(
+                CONF_REQUEST_TIMEOUT, DEFAULT_TIMEOUT
+            )): vol.All(int, vol.Range(min=1)),
+            vol.Required(CONF_DIAGNOSTICS, default=self.config_entry.options.get(
+                CONF_DIAGNOSTICS, DEFAULT_DIAGNOSTICS
+            )): bool,
+            vol.Optional(CONF_LOG_CONTAINERS, default=self.config_entry.options.get(
+                CONF_LOG_CONTAINERS, ''
+            )): str,
+            vol.Optional(CONF_LOG_PATTERNS, default=self.config_entry.options.get(
+                CONF_LOG_PATTERNS, ''
+            )): str,
+            vol.Required(CONF_LOG_LINES, default=self.config_entry.options.get(
+                CONF_LOG_LINES, DEFAULT_LOG_LINES
+            )): vol.All(int, vol.Range(min=1)),
+            vol.Required(CONF_UPDATE_CHECKS, default=self.config_entry.options.get(
+                CONF_UPDATE_CHECKS, DEFAULT_UPDATE_CHECKS
+            )): bool,
+            vol.Required(CONF_HISTORY, default=self.config_entry.options.get(
+                CONF_HISTORY, DEFAULT_HISTORY
+            )): bool,
+            vol.Required(CONF_GROUPS, default=self.config_entry.options.get(
+                CONF_GROUPS, DEFAULT_GROUPS
+            )): bool,
+            vol.Required(CONF_PROMETHEUS, default=self.config_entry.options.get(
+                CONF_PROMETHEUS, DEFAULT_PROMETHEUS
+            )): bool,
+            **{
+                vol.Optional(key, default=self.config_entry.options.get(
+                    key, self.config_entry.data.get(key, '')
+                )): str for key in CONTAINER_FILTERS
+            }
         }))
\ No newline at end of file
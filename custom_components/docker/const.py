@@ -3,30 +3,228 @@ DOMAIN = 'docker'
 
 DEFAULT_NAME = 'DockerHost'
 DEFAULT_HOST = 'unix://var/run/docker.sock'
-DEFAULT_SCAN_INTERVAL = 30
+DEFAULT_MIN_INTERVAL = 10
+DEFAULT_MAX_INTERVAL = 120
+DEFAULT_CYCLE_BUDGET = 5
 DEFAULT_CREATE_SENSORS = True
+DEFAULT_USE_EVENTS = True
+DEFAULT_RECONCILE_INTERVAL = 300
+EVENTS_RETRY_INTERVAL = 10
+INTERVAL_GROWTH = 1.5
+INTERVAL_BACKOFF = 2
+TRANSITION_WINDOW = 60
+DEFAULT_TIMEOUT = 10
+CONNECT_TIMEOUT = 3
+BREAKER_THRESHOLD = 3
+BREAKER_MIN_BACKOFF = 5
+BREAKER_MAX_BACKOFF = 300
+DEFAULT_CONNECTION_LIMIT = 10
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_KEEPALIVE_TIMEOUT = 60
+IMAGE_ERROR_TTL = 300
+DEFAULT_DF_INTERVAL = 1800
+DF_TIMEOUT = 120
+DEFAULT_DIAGNOSTICS = False
+STORAGE_VERSION = 1
+STORAGE_KEY = 'docker.{}'
+SNAPSHOT_SAVE_DELAY = 60
+DEFAULT_LOG_LINES = 100
+MAX_LOG_LINE = 4096
+MAX_LOG_FRAME = 1 << 20
+LOG_WRITE_INTERVAL = 30
+MAX_STATE_LENGTH = 255
+DEFAULT_UPDATE_CHECKS = False
+UPDATE_CHECK_INTERVAL = 3600
+DIGEST_TTL = 21600
+DIGEST_ERROR_TTL = 3600
+REGISTRY_TIMEOUT = 30
+REGISTRY_MIN_INTERVAL = 1
+REGISTRY_TOKEN_LIFETIME = 60
+DEFAULT_HISTORY = False
+DEFAULT_GROUPS = False
+DEFAULT_PROMETHEUS = False
+HISTORY_FILE = 'docker_history.{}'
+HISTORY_FLUSH_INTERVAL = 300
+HISTORY_MAX_NAMES = 4096
+HISTORY_QUERY_PERIOD = 3600
+METRICS_URL = '/api/docker/metrics'
+
+# Width in seconds (0 for the raw samples) and number of rows of each history tier
+HISTORY_TIERS = [
+    (0, 65536),
+    (60, 65536),
+    (900, 32768)
+]
 
 CREATE_SENSORS = 'create_sensors'
+CONF_USE_EVENTS = 'use_events'
+CONF_RECONCILE_INTERVAL = 'reconcile_interval'
+CONF_MIN_INTERVAL = 'min_interval'
+CONF_MAX_INTERVAL = 'max_interval'
+CONF_CYCLE_BUDGET = 'cycle_budget'
+CONF_MAX_CONCURRENCY = 'max_concurrency'
+CONF_INCLUDE_NAMES = 'include_names'
+CONF_EXCLUDE_NAMES = 'exclude_names'
+CONF_INCLUDE_LABELS = 'include_labels'
+CONF_EXCLUDE_LABELS = 'exclude_labels'
+CONF_INCLUDE_PROJECTS = 'include_projects'
+CONF_EXCLUDE_PROJECTS = 'exclude_projects'
+CONF_INCLUDE_STATUS = 'include_status'
+CONF_REQUEST_TIMEOUT = 'request_timeout'
+CONF_DIAGNOSTICS = 'diagnostic_sensors'
+CONF_LOG_CONTAINERS = 'log_containers'
+CONF_LOG_PATTERNS = 'log_patterns'
+CONF_LOG_LINES = 'log_lines'
+CONF_UPDATE_CHECKS = 'update_checks'
+CONF_HISTORY = 'metric_history'
+CONF_GROUPS = 'group_entities'
+CONF_PROMETHEUS = 'prometheus_metrics'
 
-DOCKER_CLIENT = 'docker_client'
-DATA_UPDATED = "docker_data_updated"
-DATA_VERSION_INFO = 'docker_version_info'
-DATA_HOST = 'docker_host'
+DATA_COORDINATOR = 'docker_coordinator'
+DATA_UPDATED = "docker_data_updated_{}"
+DIAGNOSTICS_UPDATED = "docker_diagnostics_updated_{}"
+CONTAINER_UPDATED = "docker_container_updated_{}_{}"
+CONTAINERS_ADDED = "docker_containers_added_{}"
+GROUP_UPDATED = "docker_group_updated_{}_{}"
+GROUPS_ADDED = "docker_groups_added_{}"
+IMAGE_UPDATED = "docker_image_updated_{}_{}"
+IMAGES_ADDED = "docker_images_added_{}"
+DATA_METRICS_VIEW = 'docker_metrics_view'
 CONF_CONTAINERS = 'docker_containers'
 
-COMPONENTS = ['sensor', 'switch']
+COMPONENTS = ['sensor', 'binary_sensor', 'switch']
+
+DEFAULT_STOP_TIMEOUT = 10
+
+COMPOSE_PROJECT_LABEL = 'com.docker.compose.project'
+SWARM_SERVICE_LABEL = 'com.docker.swarm.service.name'
+
+CONTAINER_FILTERS = [
+    CONF_INCLUDE_NAMES,
+    CONF_EXCLUDE_NAMES,
+    CONF_INCLUDE_LABELS,
+    CONF_EXCLUDE_LABELS,
+    CONF_INCLUDE_PROJECTS,
+    CONF_EXCLUDE_PROJECTS,
+    CONF_INCLUDE_STATUS
+]
+
+ATTR_HOST = 'host'
+ATTR_CONTAINERS = 'containers'
+ATTR_LABELS = 'labels'
+ATTR_TIMEOUT = 'timeout'
+ATTR_RESTORED = 'restored'
+ATTR_CONTAINER = 'container'
+ATTR_PERIOD = 'period'
+ATTR_METRICS = 'metrics'
+
+EVENT_LOG_MATCH = 'docker_log_match'
+EVENT_HISTORY_RESULT = 'docker_history_result'
+
+SERVICE_QUERY_HISTORY = 'query_history'
+
+CONTAINER_ACTIONS = ['start', 'stop', 'restart', 'pause', 'unpause']
+
+EXPECTED_STATUS = {
+    'start': 'running',
+    'stop': 'exited',
+    'restart': 'running',
+    'pause': 'paused',
+    'unpause': 'running'
+}
+
+TRANSITIONAL_STATES = ['created', 'restarting', 'removing']
+
+CONTAINER_EVENTS = [
+    'create', 'start', 'stop', 'die', 'destroy', 'rename',
+    'pause', 'unpause', 'health_status'
+]
 
 PRECISION = 2
 
+# A container that restarted this often within the window is crash looping
+CRASH_LOOP_WINDOW = 600
+CRASH_LOOP_RESTARTS = 3
+
 HOST_MON_COND = {
     'host_version': ['Version', None, 'mdi:information-outline', None, 'version'],
     'host_apiversion': ['ApiVersion', None, 'mdi:information-outline', None, 'api_version'],
     'host_os': ['OS', None, 'mdi:information-outline', None, 'os'],
     'host_archiecture': ['Architecture', None, 'mdi:information-outline', None, 'arch'],
+    'host_update_duration': ['Update Duration', 's', 'mdi:timer-outline', None, 'update_duration'],
+    'host_containers_running': ['Containers Running', None, 'mdi:docker', None, 'containers_running'],
+    'host_containers_stopped': ['Containers Stopped', None, 'mdi:docker', None, 'containers_stopped'],
+    'host_containers_paused': ['Containers Paused', None, 'mdi:docker', None, 'containers_paused'],
+    'host_cpu_percent': ['CPU', '%', 'mdi:chip', None, 'cpu_percent'],
+    'host_memory_usage': ['Memory', 'MiB', 'mdi:memory', None, 'memory_usage'],
+    'host_images': ['Images', None, 'mdi:layers', None, 'images'],
+    'host_images_size': ['Images Size', 'MB', 'mdi:harddisk', None, 'images_size'],
+    'host_containers_size': ['Containers Size', 'MB', 'mdi:harddisk', None, 'containers_size'],
+    'host_volumes_size': ['Volumes Size', 'MB', 'mdi:harddisk', None, 'volumes_size'],
+    'host_build_cache_size': ['Build Cache Size', 'MB', 'mdi:harddisk', None, 'build_cache_size'],
+    'host_image_updates': ['Image Updates', None, 'mdi:package-up', None, 'image_updates'],
+}
+
+DIAGNOSTIC_MON_COND = {
+    'host_version_time': ['Version Time', 's', 'mdi:timer-outline', None, 'version_time'],
+    'host_list_time': ['List Time', 's', 'mdi:timer-outline', None, 'list_time'],
+    'host_refresh_p50': ['Refresh p50', 's', 'mdi:timer-outline', None, 'refresh_p50'],
+    'host_refresh_p95': ['Refresh p95', 's', 'mdi:timer-outline', None, 'refresh_p95'],
+    'host_refresh_max': ['Refresh Max', 's', 'mdi:timer-outline', None, 'refresh_max'],
+    'host_queue_wait': ['Queue Wait', 's', 'mdi:timer-sand', None, 'queue_wait_max'],
+    'host_dispatch_time': ['Dispatch Time', 's', 'mdi:timer-outline', None, 'dispatch_time'],
+    'host_entity_writes': ['Entity Writes', None, 'mdi:pencil', None, 'cycle_writes'],
+    'host_api_calls': ['API Calls', None, 'mdi:api', None, 'api_calls'],
+    'host_api_errors': ['API Errors', None, 'mdi:alert-circle-outline', None, 'api_errors'],
+    'host_update_errors': ['Update Errors', None, 'mdi:alert-circle-outline', None, 'cycle_errors'],
 }
 
+STOPPED_STATES = ['created', 'exited', 'dead']
+
 CONTAINER_MON_COND = {
     'container_status': ['Status', None, 'mdi:checkbox-marked-circle-outline', None],
     'container_uptime': ['Up Time', '', 'mdi:clock', 'timestamp'],
-    'container_image': ['Image', None, 'mdi:information-outline', None]
-}
\ No newline at end of file
+    'container_image': ['Image', None, 'mdi:information-outline', None],
+    'container_cpu_percent': ['CPU', '%', 'mdi:chip', None],
+    'container_memory_usage': ['Memory', 'MiB', 'mdi:memory', None],
+    'container_memory_limit': ['Memory Limit', 'MiB', 'mdi:memory', None],
+    'container_memory_percent': ['Memory Usage', '%', 'mdi:memory', None],
+    'container_network_rx': ['Network Rx', 'kB/s', 'mdi:download-network', None],
+    'container_network_tx': ['Network Tx', 'kB/s', 'mdi:upload-network', None],
+    'container_block_read': ['Block Read', 'kB/s', 'mdi:harddisk', None],
+    'container_block_write': ['Block Write', 'kB/s', 'mdi:harddisk', None],
+    'container_health': ['Health', None, 'mdi:heart-pulse', None],
+    'container_restart_count': ['Restart Count', None, 'mdi:restart', None],
+    'container_exit_code': ['Exit Code', None, 'mdi:alert-circle-outline', None],
+    'container_recent_restarts': ['Recent Restarts', None, 'mdi:restart-alert', None],
+    'container_log_matches': ['Log Matches', None, 'mdi:text-search', None],
+    'container_last_log': ['Last Log Line', None, 'mdi:text', None]
+}
+
+# Only created for the containers whose logs are followed
+LOG_MON_COND = [
+    'container_log_matches',
+    'container_last_log'
+]
+
+BINARY_MON_COND = {
+    'container_unhealthy': ['Unhealthy', 'mdi:heart-broken', 'problem'],
+    'container_oom_killed': ['OOM Killed', 'mdi:memory', 'problem'],
+    'container_crash_loop': ['Crash Loop', 'mdi:restart-alert', 'problem']
+}
+
+# Only created when the image update checks are enabled
+UPDATE_MON_COND = [
+    'host_image_updates'
+]
+
+RESOURCE_MON_COND = [
+    'container_cpu_percent',
+    'container_memory_usage',
+    'container_memory_limit',
+    'container_memory_percent',
+    'container_network_rx',
+    'container_network_tx',
+    'container_block_read',
+    'container_block_write'
+]
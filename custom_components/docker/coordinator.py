@@ -0,0 +1,95 @@
+"""Shared refresh scheduler for all Docker hosts."""
+import logging
+import math
+
+from homeassistant.core import callback
+from homeassistant.helpers.event import async_call_later
+
+_LOGGER = logging.getLogger(__name__)
+
+# Successive hosts are phased by the golden ratio, which keeps them evenly
+# spread over their interval however many hosts are added
+PHASE_STEP = 0.6180339887
+
+
+class DockerCoordinator:
+    """Schedule the refreshes of all Docker hosts from a single timer.
+
+    Every host is due at its own time, so hosts with the same interval are
+    staggered rather than aligned on the same tick. Hosts that are due
+    together refresh concurrently. A host is only due again once its cycle
+    has finished, after the interval it asks for at that point.
+    """
+
+    def __init__(self, hass):
+        self.hass = hass
+        self._hosts = {}
+        self._phase = 0.0
+        self._unsub_timer = None
+
+    @property
+    def hosts(self):
+        return [host for host, _ in self._hosts.values()]
+
+    @callback
+    def async_schedule(self, host, interval):
+        """Add a host, or make it due within the interval."""
+        entry_id = host.config_entry.entry_id
+        now = self.hass.loop.time()
+        if entry_id in self._hosts:
+            _, due = self._hosts[entry_id]
+            due = min(due, now + interval)
+        else:
+            self._phase = (self._phase + PHASE_STEP) % 1
+            due = now + interval * self._phase
+        self._hosts[entry_id] = (host, due)
+        self._async_reschedule()
+
+    @callback
+    def async_unschedule(self, host):
+        """Remove a host."""
+        self._hosts.pop(host.config_entry.entry_id, None)
+        self._async_reschedule()
+
+    @callback
+    def _async_reschedule(self):
+        if self._unsub_timer is not None:
+            self._unsub_timer()
+            self._unsub_timer = None
+        if not self._hosts:
+            return
+        due = min(due for _, due in self._hosts.values())
+        if due == math.inf:
+            return
+        self._unsub_timer = async_call_later(
+            self.hass, max(due - self.hass.loop.time(), 0), self._async_run_due
+        )
+
+    @callback
+    def _async_run_due(self, event_time=None):
+        """Start the refresh of every host that is due."""
+        self._unsub_timer = None
+        now = self.hass.loop.time()
+        for entry_id, (host, due) in list(self._hosts.items()):
+            if due > now:
+                continue
+            self._hosts[entry_id] = (host, math.inf)
+            self.hass.async_create_task(self._async_refresh(host))
+        self._async_reschedule()
+
+    async def _async_refresh(self, host):
+        try:
+            if host.updating:
+                _LOGGER.debug("Skipping refresh of {}, previous cycle still running".format(
+                    host.config_entry.title
+                ))
+            else:
+                await host.async_update()
+        finally:
+            # Even after an unexpected error, or the host would never be due again
+            entry_id = host.config_entry.entry_id
+            if entry_id in self._hosts:
+                _, due = self._hosts[entry_id]
+                due = min(due, self.hass.loop.time() + host.get_scan_interval())
+                self._hosts[entry_id] = (host, due)
+                self._async_reschedule()
@@ -0,0 +1,164 @@
+"""Base entities of the Docker hosts, containers and groups."""
+from typing import Any, Dict
+
+from homeassistant.core import callback
+from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+
+from .const import (
+    DOMAIN,
+    ATTR_RESTORED,
+    DATA_UPDATED,
+    CONTAINER_UPDATED,
+    GROUP_UPDATED
+)
+
+
+class DockerEntity(Entity):
+    """An entity the Docker host pushes its changes to.
+
+    The host sends a signal when the data an entity shows changed. The entity
+    then refreshes its fields in _update_state, and writes its state only if
+    the state, availability or restored flag differ from what was written.
+    """
+
+    def __init__(self, hass, api, clientname):
+        self._hass = hass
+        self._api = api
+        self._clientname = clientname
+        self._state = None
+        self._attributes = {}
+        self._available = True
+        self._restored = False
+
+    @property
+    def should_poll(self):
+        return False
+
+    @property
+    def available(self):
+        """Return False while the Docker host is unreachable."""
+        return self._available
+
+    @property
+    def extra_state_attributes(self):
+        """Return the state attributes."""
+        if self._restored:
+            return dict(self._attributes, **{ATTR_RESTORED: True})
+        return self._attributes
+
+    def _signals(self):
+        """Return the signals that announce changes to the entity."""
+        raise NotImplementedError
+
+    async def async_added_to_hass(self):
+        """Handle entity which will be added."""
+        for signal in self._signals():
+            self.async_on_remove(async_dispatcher_connect(self._hass, signal, self._async_updated))
+
+    def _written(self):
+        """Return what, when changed, needs a state write."""
+        return (self._state, self._available, self._restored)
+
+    @callback
+    def _async_updated(self):
+        """Write the state only if it changed."""
+        written = self._written()
+        self._update_state()
+        if self._written() != written:
+            self.async_write_ha_state()
+            self._count_write()
+
+    def _count_write(self):
+        self._api.metrics.count_write()
+
+    def _update_state(self):
+        self._available = self._api.available
+        self._restored = self._api.restored
+
+    async def async_update(self) -> None:
+        self._update_state()
+
+
+class DockerHostEntity(DockerEntity):
+    """An entity of the Docker host itself."""
+
+    def _signals(self):
+        return [DATA_UPDATED.format(self._api.config_entry.entry_id)]
+
+    @property
+    def device_info(self) -> Dict[str, Any]:
+        """Return device information about this Docker host instance."""
+        return {
+            "identifiers": {
+                (DOMAIN, self._clientname)
+            },
+            "name": self._clientname,
+            "manufacturer": "Docker",
+            "model": "Host",
+            "sw_version": self._api.version_info.get("version")
+        }
+
+
+class DockerContainerEntity(DockerEntity):
+    """An entity of a container, which follows the container across recreations."""
+
+    def __init__(self, hass, api, clientname, container_name):
+        super().__init__(hass, api, clientname)
+        self._container_name = container_name
+
+    def _signals(self):
+        return [CONTAINER_UPDATED.format(self._api.config_entry.entry_id, self._container_name)]
+
+    def _update_state(self):
+        super()._update_state()
+        # Look the container up by name, as a recreated container is a new object
+        container = self._api.get_container(self._container_name)
+        if container is not None:
+            self._update_container(container)
+
+    def _update_container(self, container):
+        """Take the state from the current container of the name."""
+        raise NotImplementedError
+
+    @property
+    def device_info(self) -> Dict[str, Any]:
+        """Return device information about this Docker container."""
+        return {
+            "identifiers": {
+                (DOMAIN, self._clientname, self._container_name)
+            },
+            "name": self._container_name.title(),
+            "manufacturer": "Docker",
+            "model": "Container",
+            "sw_version": self._api.version_info.get("version")
+        }
+
+
+class DockerGroupEntity(DockerEntity):
+    """An entity of a compose project or swarm service."""
+
+    def __init__(self, hass, api, clientname, group):
+        super().__init__(hass, api, clientname)
+        self._group = group
+
+    def _signals(self):
+        entry_id = self._api.config_entry.entry_id
+        # The host signal for the availability of the host
+        return [GROUP_UPDATED.format(entry_id, self._group), DATA_UPDATED.format(entry_id)]
+
+    def _get_group(self):
+        return self._api.groups.get(self._group) or {'running': 0, 'containers': 0, 'members': []}
+
+    @property
+    def device_info(self) -> Dict[str, Any]:
+        """Return device information about this group of containers."""
+        return {
+            "identifiers": {
+                (DOMAIN, self._clientname, 'group', self._group)
+            },
+            "name": self._group.title(),
+            "manufacturer": "Docker",
+            "model": "Container Group",
+            "sw_version": self._api.version_info.get("version")
+        }
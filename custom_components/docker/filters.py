@@ -0,0 +1,173 @@
+"""Selection of the containers that are monitored."""
+from fnmatch import fnmatchcase
+
+from .const import (
+    COMPOSE_PROJECT_LABEL,
+    SWARM_SERVICE_LABEL,
+    CONF_INCLUDE_NAMES,
+    CONF_EXCLUDE_NAMES,
+    CONF_INCLUDE_LABELS,
+    CONF_EXCLUDE_LABELS,
+    CONF_INCLUDE_PROJECTS,
+    CONF_EXCLUDE_PROJECTS,
+    CONF_INCLUDE_STATUS,
+    CONTAINER_FILTERS
+)
+
+# Characters with a meaning in the (Go) regular expressions of the name filter
+REGEX_SPECIAL = set('\\.+()[]{}|^$')
+
+
+def split(value, separator=','):
+    """Split a comma (or otherwise) separated option into its items."""
+    if isinstance(value, (list, tuple)):
+        return [item.strip() for item in value if item.strip()]
+    return [item.strip() for item in (value or '').split(separator) if item.strip()]
+
+
+def _class_to_regex(chars):
+    """Translate the inside of a glob character class, None if it has an empty range."""
+    negate = chars.startswith('!')
+    if negate:
+        chars = chars[1:]
+    index = 0
+    while index < len(chars):
+        if index + 2 < len(chars) and chars[index + 1] == '-':
+            if chars[index] > chars[index + 2]:
+                return None
+            index += 3
+        else:
+            index += 1
+    return '[{}{}]'.format('^' if negate else '', ''.join(
+        char if char.isalnum() or char == '-' else '\\' + char for char in chars
+    ))
+
+
+def glob_to_regex(pattern):
+    """Translate a name glob into a regular expression for the Engine API.
+
+    Follows fnmatch, which matches the names locally: [...] is a character
+    class, [!...] a negated one, and a [ without a closing ] is literal.
+    Returns None for a glob the daemon cannot match the same way.
+    """
+    regex = ''
+    index = 0
+    while index < len(pattern):
+        char = pattern[index]
+        index += 1
+        if char == '[':
+            end = index
+            if end < len(pattern) and pattern[end] == '!':
+                end += 1
+            if end < len(pattern) and pattern[end] == ']':
+                end += 1
+            end = pattern.find(']', end)
+            if end < 0:
+                regex += '\\['
+                continue
+            translated = _class_to_regex(pattern[index:end])
+            if translated is None:
+                return None
+            regex += translated
+            index = end + 1
+        elif char == '*':
+            regex += '.*'
+        elif char == '?':
+            regex += '.'
+        elif char in REGEX_SPECIAL:
+            regex += '\\' + char
+        else:
+            regex += char
+    return '^/?{}$'.format(regex)
+
+
+def label_matches(selector, labels):
+    """Return True if the labels match a key or key=value selector."""
+    key, sep, value = selector.partition('=')
+    if key not in labels:
+        return False
+    return not sep or labels[key] == value
+
+
+def group_of(labels):
+    """Return the compose project or swarm service of a container, if any."""
+    labels = labels or {}
+    return labels.get(COMPOSE_PROJECT_LABEL) or labels.get(SWARM_SERVICE_LABEL)
+
+
+class ContainerFilter:
+    """Include and exclude selectors by name glob, label, compose project and status.
+
+    As much of the selection as the Engine API supports is pushed down into
+    its filters, so unwanted containers are not even listed. The remainder
+    (exclusions, and alternatives the API would AND together) is applied to
+    the list summary, before a container is inspected or added.
+    """
+
+    def __init__(self, options):
+        self.include_names = split(options.get(CONF_INCLUDE_NAMES))
+        self.exclude_names = split(options.get(CONF_EXCLUDE_NAMES))
+        self.include_labels = split(options.get(CONF_INCLUDE_LABELS))
+        self.exclude_labels = split(options.get(CONF_EXCLUDE_LABELS))
+        self.include_projects = split(options.get(CONF_INCLUDE_PROJECTS))
+        self.exclude_projects = split(options.get(CONF_EXCLUDE_PROJECTS))
+        self.include_status = split(options.get(CONF_INCLUDE_STATUS))
+
+    @classmethod
+    def from_entry(cls, config_entry):
+        """Create the filter of a config entry; options override the initial setup."""
+        options = {
+            key: config_entry.options.get(key, config_entry.data.get(key))
+            for key in CONTAINER_FILTERS
+        }
+        return cls(options)
+
+    def _label_filters(self):
+        labels = list(self.include_labels)
+        if len(self.include_projects) == 1:
+            labels.append('{}={}'.format(COMPOSE_PROJECT_LABEL, self.include_projects[0]))
+        return labels
+
+    @property
+    def api_filters(self):
+        """Return the filters for the container list."""
+        filters = {}
+        names = [glob_to_regex(pattern) for pattern in self.include_names]
+        if names and None not in names:
+            # Otherwise only matches() selects by name
+            filters['name'] = names
+        labels = self._label_filters()
+        if labels:
+            filters['label'] = labels
+        if self.include_status:
+            filters['status'] = self.include_status
+        return filters or None
+
+    @property
+    def event_filters(self):
+        """Return the label filters that also apply to the events stream."""
+        labels = self._label_filters()
+        return {'label': labels} if labels else {}
+
+    def matches(self, name, labels, status=None):
+        """Return True if a container is selected.
+
+        The status is only checked if given, as events do not carry it.
+        """
+        labels = labels or {}
+        if self.include_names and not any(fnmatchcase(name, pattern) for pattern in self.include_names):
+            return False
+        if any(fnmatchcase(name, pattern) for pattern in self.exclude_names):
+            return False
+        if not all(label_matches(selector, labels) for selector in self.include_labels):
+            return False
+        if any(label_matches(selector, labels) for selector in self.exclude_labels):
+            return False
+        project = labels.get(COMPOSE_PROJECT_LABEL)
+        if self.include_projects and project not in self.include_projects:
+            return False
+        if project is not None and project in self.exclude_projects:
+            return False
+        if status is not None and self.include_status and status not in self.include_status:
+            return False
+        return True
@@ -0,0 +1,377 @@
+"""High resolution history of the container metrics, in a file of its own."""
+import logging
+import os
+
+import numpy as np
+
+from .const import HISTORY_TIERS, HISTORY_MAX_NAMES, PRECISION
+from .stats import METRICS
+
+_LOGGER = logging.getLogger(__name__)
+
+MAGIC = b'DKRHIST1'
+NAME_SIZE = 128
+
+# Rows of the downsampled tiers keep the mean, minimum and maximum
+MEAN, MIN, MAX = range(3)
+
+
+def _column(buffer, offset, dtype, shape):
+    """Return an array over part of the buffer, and the offset after it."""
+    dtype = np.dtype(dtype)
+    array = np.ndarray(shape, dtype, buffer=buffer, offset=offset)
+    return array, offset + array.nbytes
+
+
+def _header_dtype(tiers):
+    return np.dtype([
+        ('magic', 'S8'),
+        ('layout', '<u8', (2 * len(tiers) + 2,)),
+        ('heads', '<u8', (len(tiers),)),
+        ('names', '<u8')
+    ])
+
+
+def remove(path):
+    """Delete the history file of a host, if there is one."""
+    if os.path.exists(path):
+        os.remove(path)
+
+
+class Tier:
+    """Fixed size ring of rows, stored column by column.
+
+    The raw tier (width 0) has a single value per metric; the downsampled
+    tiers a mean, minimum and maximum, over the samples they count.
+    """
+
+    def __init__(self, buffer, offset, width, capacity, metrics):
+        self.width = width
+        self.capacity = capacity
+        self.time, offset = _column(buffer, offset, '<f8', (capacity,))
+        self.key, offset = _column(buffer, offset, '<u4', (capacity,))
+        self.count, offset = _column(buffer, offset, '<u4', (capacity,))
+        self.values, offset = _column(
+            buffer, offset, '<f4', (3 if width else 1, metrics, capacity)
+        )
+        self.end = offset
+
+    @staticmethod
+    def size(width, capacity, metrics):
+        return capacity * (8 + 4 + 4 + 4 * (3 if width else 1) * metrics)
+
+    def write(self, head, times, keys, counts, values):
+        """Write rows from the head on, overwriting the oldest; returns the new head."""
+        positions = (head + np.arange(len(times))) % self.capacity
+        self.time[positions] = times
+        self.key[positions] = keys
+        self.count[positions] = counts
+        self.values[:, :, positions] = values
+        return head + len(times)
+
+    def oldest(self, head):
+        """Return the time of the oldest row, infinity if there is none."""
+        if head == 0:
+            return np.inf
+        return float(self.time[head % self.capacity if head >= self.capacity else 0])
+
+    def select(self, key, start, end):
+        """Return the count, sum, minimum and maximum of the rows of a key within a window."""
+        if self.width:
+            # Including the bucket the window starts in
+            after = self.time > start - self.width
+        else:
+            after = self.time >= start
+        mask = (self.key == key) & (self.count > 0) & after & (self.time < end)
+        counts = self.count[mask].astype(np.float64)
+        if self.width:
+            means, mins, maxs = (self.values[stat][:, mask] for stat in (MEAN, MIN, MAX))
+        else:
+            means = mins = maxs = self.values[0][:, mask]
+        valid = ~np.isnan(means)
+        return (
+            np.where(valid, counts, 0).sum(axis=1),
+            np.where(valid, means * counts, 0).sum(axis=1),
+            np.fmin.reduce(mins, axis=1, initial=np.nan),
+            np.fmax.reduce(maxs, axis=1, initial=np.nan)
+        )
+
+
+class Downsampler:
+    """Folds rows into buckets of a fixed width per key, in memory.
+
+    A bucket is complete once a row of a later bucket arrives for its key;
+    the complete buckets are returned as rows for the next tier.
+    """
+
+    def __init__(self, width, metrics, keys):
+        self.width = width
+        self.start = np.full(keys, np.nan)
+        self.count = np.zeros(keys, dtype=np.uint32)
+        self.samples = np.zeros((keys, metrics))
+        self.sum = np.zeros((keys, metrics))
+        self.min = np.full((keys, metrics), np.nan)
+        self.max = np.full((keys, metrics), np.nan)
+
+    def add(self, times, keys, counts, means, mins, maxs):
+        """Fold in rows; returns the complete buckets as (times, keys, counts, values)."""
+        buckets = np.floor(times / self.width) * self.width
+        starts = self.start[keys]
+        # A missing start never equals itself
+        complete = keys[(starts == starts) & (starts != buckets)]
+        rows = None
+        if len(complete):
+            with np.errstate(divide='ignore', invalid='ignore'):
+                mean = np.where(
+                    self.samples[complete] > 0, self.sum[complete] / self.samples[complete], np.nan
+                )
+            rows = (
+                self.start[complete], complete, self.count[complete],
+                np.stack((mean.T, self.min[complete].T, self.max[complete].T))
+            )
+            self.count[complete] = 0
+            self.samples[complete] = 0
+            self.sum[complete] = 0
+            self.min[complete] = np.nan
+            self.max[complete] = np.nan
+        self.start[keys] = buckets
+        valid = ~np.isnan(means)
+        weights = np.where(valid, counts[:, None], 0)
+        self.count[keys] += counts.astype(np.uint32)
+        self.samples[keys] += weights
+        self.sum[keys] += np.where(valid, means, 0) * weights
+        self.min[keys] = np.fmin(self.min[keys], mins)
+        self.max[keys] = np.fmax(self.max[keys], maxs)
+        return rows
+
+    def reset(self, key):
+        """Drop the open bucket of a key."""
+        self.start[key] = np.nan
+        self.count[key] = 0
+        self.samples[key] = 0
+        self.sum[key] = 0
+        self.min[key] = np.nan
+        self.max[key] = np.nan
+
+
+class MetricHistory:
+    """Metric history of the containers of a host, in a memory-mapped file.
+
+    Every computed sample is appended to the raw tier and folded into one
+    minute buckets, which are folded into 15 minute buckets in turn. Each
+    tier is a ring of rows of a fixed size, stored column by column, so an
+    append touches a few pages and a query scans only the columns it needs.
+    Container names are kept in the file too, as the keys of the rows.
+
+    The entities only get the mean of the last complete minute, so the
+    recorder stores a state per minute at most instead of every sample.
+
+    Once all keys are taken, the key of the container seen the longest ago
+    (removed containers first) goes to the next new name, and its rows are
+    dropped.
+    """
+
+    def __init__(self, path, tiers=HISTORY_TIERS, metrics=METRICS, max_names=HISTORY_MAX_NAMES):
+        self.path = path
+        self.metrics = list(metrics)
+        self.max_names = max_names
+        self._tier_specs = tiers
+        self.tiers = []
+        self._downsamplers = []
+        self._map = None
+        self._header = None
+        self._names = None
+        self._keys = {}
+        self._last_seen = None
+        self._summaries = None
+
+    def open(self):
+        """Map the file, creating it if it does not exist or has another layout.
+
+        Does blocking I/O, so runs in the executor.
+        """
+        header = _header_dtype(self._tier_specs)
+        layout = [len(self.metrics), self.max_names]
+        for width, capacity in self._tier_specs:
+            layout += [width, capacity]
+        size = header.itemsize + self.max_names * NAME_SIZE + sum(
+            Tier.size(width, capacity, len(self.metrics)) for width, capacity in self._tier_specs
+        )
+        # Keep the columns aligned to their item size
+        size += -header.itemsize % 8
+
+        valid = False
+        if os.path.exists(self.path) and os.path.getsize(self.path) == size:
+            stored = np.fromfile(self.path, dtype=header, count=1)[0]
+            valid = stored['magic'] == MAGIC and list(stored['layout']) == layout
+        if not valid:
+            if os.path.exists(self.path):
+                _LOGGER.warning("Discarding Docker metric history with another layout")
+            with open(self.path, 'wb') as file:
+                # Sparse where the file system allows, so the unused rows take no space
+                file.truncate(size)
+
+        self._map = np.memmap(self.path, dtype=np.uint8, mode='r+', shape=(size,))
+        self._header = np.ndarray((), header, buffer=self._map)
+        if not valid:
+            self._header['magic'] = MAGIC
+            self._header['layout'] = layout
+        offset = header.itemsize + (-header.itemsize % 8)
+        self._names, offset = _column(self._map, offset, 'S{}'.format(NAME_SIZE), (self.max_names,))
+        self._keys = {
+            name.decode(): key for key, name in enumerate(self._names[:int(self._header['names'])])
+        }
+        self.tiers = []
+        for width, capacity in self._tier_specs:
+            tier = Tier(self._map, offset, width, capacity, len(self.metrics))
+            self.tiers.append(tier)
+            offset = tier.end
+        self._downsamplers = [
+            Downsampler(width, len(self.metrics), self.max_names) for width, _ in self._tier_specs[1:]
+        ]
+        self._summaries = np.full((self.max_names, len(self.metrics)), np.nan)
+        self._last_seen = np.zeros(self.max_names)
+
+    def flush(self):
+        """Write the changed pages to disk; runs in the executor."""
+        if self._map is not None:
+            self._map.flush()
+
+    def close(self):
+        self.flush()
+        self.tiers = []
+        self._header = None
+        self._names = None
+        self._map = None
+
+    def tracks(self, name) -> bool:
+        """Return True if the history has a key for a container."""
+        return name in self._keys
+
+    def release(self, names):
+        """Make the keys of removed containers the first to be reused."""
+        for name in names:
+            key = self._keys.get(name)
+            if key is not None:
+                self._last_seen[key] = -1
+
+    def _get_key(self, name, timestamp):
+        key = self._keys.get(name)
+        if key is None:
+            key = int(self._header['names'])
+            if key < self.max_names:
+                self._header['names'] = key + 1
+            else:
+                key = self._reclaim(timestamp)
+                if key is None:
+                    return None
+            self._names[key] = name.encode()[:NAME_SIZE]
+            self._keys[name] = key
+        self._last_seen[key] = timestamp
+        return key
+
+    def _reclaim(self, timestamp):
+        """Free the key seen the longest ago, unless it is seen at this timestamp."""
+        key = int(np.argmin(self._last_seen))
+        if self._last_seen[key] >= timestamp:
+            return None
+        del self._keys[self._names[key].decode()]
+        for tier in self.tiers:
+            tier.count[tier.key == key] = 0
+        for downsampler in self._downsamplers:
+            downsampler.reset(key)
+        self._summaries[key] = np.nan
+        return key
+
+    def append(self, timestamp, names, values):
+        """Record the metrics of containers at a (wall clock) timestamp.
+
+        Returns the names of the containers that completed a minute, i.e.
+        whose summary changed.
+        """
+        known = [
+            (key, row) for key, row in zip((self._get_key(name, timestamp) for name in names), values)
+            if key is not None
+        ]
+        if not known:
+            return []
+        keys = np.array([key for key, _ in known], dtype=np.uint32)
+        values = np.array([row for _, row in known]).T
+        times = np.full(len(keys), float(timestamp))
+        counts = np.ones(len(keys), dtype=np.uint32)
+
+        heads = self._header['heads']
+        heads[0] = self.tiers[0].write(int(heads[0]), times, keys, counts, values[None])
+        rows = (times, keys, counts, values.T, values.T, values.T)
+        summarized = []
+        for index, downsampler in enumerate(self._downsamplers, 1):
+            complete = downsampler.add(*rows)
+            if complete is None:
+                break
+            times, keys, counts, values = complete
+            heads[index] = self.tiers[index].write(int(heads[index]), times, keys, counts, values)
+            if index == 1:
+                self._summaries[keys] = values[MEAN].T
+                summarized = [self._names[key].decode() for key in keys]
+            rows = (times, keys, counts, values[MEAN].T, values[MIN].T, values[MAX].T)
+        return summarized
+
+    def get_summary(self, name):
+        """Return the mean metrics of the last complete minute of a container.
+
+        Returns None for containers without a key.
+        """
+        key = self._keys.get(name)
+        if key is None or self._summaries is None:
+            return None
+        return {
+            metric: (round(float(value), PRECISION) if value == value else None)
+            for metric, value in zip(self.metrics, self._summaries[key])
+        }
+
+    def query(self, name, start, end):
+        """Return the minimum, maximum and mean of each metric of a container in a window.
+
+        The recent part of the window comes from the finest tier that still
+        has it, older parts from the coarser tiers. Reads the file, so runs
+        in the executor.
+        """
+        key = self._keys.get(name)
+        if key is None:
+            return None
+        heads = self._header['heads']
+        samples = np.zeros(len(self.metrics))
+        total = np.zeros(len(self.metrics))
+        lowest = np.full(len(self.metrics), np.nan)
+        highest = np.full(len(self.metrics), np.nan)
+        upper = end
+        for index, (tier, head) in enumerate(zip(self.tiers, heads)):
+            lower = max(start, tier.oldest(int(head)))
+            if lower > start and index + 1 < len(self.tiers):
+                # Hand over at a bucket boundary of the next tier, so no sample counts twice
+                width = self.tiers[index + 1].width
+                lower = np.ceil(lower / width) * width
+            if lower < upper:
+                count, part, low, high = tier.select(key, lower, upper)
+                samples += count
+                total += part
+                lowest = np.fmin(lowest, low)
+                highest = np.fmax(highest, high)
+                upper = lower
+            if upper <= start:
+                break
+
+        def value(number):
+            return round(float(number), PRECISION) if number == number else None
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = np.where(samples > 0, total / samples, np.nan)
+        return {
+            metric: {
+                'min': value(lowest[index]),
+                'max': value(highest[index]),
+                'mean': value(means[index]),
+                'samples': int(samples[index])
+            }
+            for index, metric in enumerate(self.metrics)
+        }
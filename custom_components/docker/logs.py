@@ -0,0 +1,209 @@
+"""Following container logs for pattern triggers."""
+import asyncio
+import logging
+import re
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+from homeassistant.const import CONF_NAME
+
+from .api import DockerApiError
+from .const import (
+    DEFAULT_LOG_LINES,
+    EVENT_LOG_MATCH,
+    EVENTS_RETRY_INTERVAL,
+    LOG_WRITE_INTERVAL,
+    MAX_LOG_LINE,
+    MAX_LOG_FRAME
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+STREAMS = {0: 'stdin', 1: 'stdout', 2: 'stderr'}
+
+# Size of the frame header of a multiplexed stream: stream, 3 x 0, length
+HEADER_SIZE = 8
+
+BACK_REFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+
+
+def next_since(timestamp):
+    """Return the since parameter for the lines after an RFC 3339 log timestamp."""
+    seconds, _, fraction = timestamp.rstrip('Z').partition('.')
+    epoch = datetime.strptime(seconds, '%Y-%m-%dT%H:%M:%S').replace(tzinfo=timezone.utc).timestamp()
+    nanoseconds = int(epoch) * 10 ** 9 + int(fraction[:9].ljust(9, '0')) + 1
+    return '{}.{:09d}'.format(nanoseconds // 10 ** 9, nanoseconds % 10 ** 9)
+
+
+class LogDemuxer:
+    """Split a log stream into lines per output stream, as its chunks arrive.
+
+    Containers without a TTY multiplex stdout and stderr in frames with an
+    8 byte header; with a TTY the stream is the raw output. Chunks may end
+    anywhere, so incomplete frames and lines are carried over to the next
+    chunk. A line longer than MAX_LOG_LINE is cut, so a stream without line
+    breaks cannot grow the buffers. A header that is not a valid frame header
+    (a TTY stream taken for a multiplexed one) switches to the raw output,
+    rather than waiting for a frame size read from the text.
+    """
+
+    def __init__(self, multiplexed=True, name=None):
+        self.multiplexed = multiplexed
+        self.name = name
+        self._buffer = bytearray()
+        self._partial = {}
+
+    def feed(self, chunk):
+        """Return the (stream, line) pairs completed by a chunk."""
+        if not self.multiplexed:
+            return self._split('stdout', chunk)
+        self._buffer += chunk
+        lines = []
+        while len(self._buffer) >= HEADER_SIZE:
+            size = int.from_bytes(self._buffer[4:HEADER_SIZE], 'big')
+            if self._buffer[0] not in STREAMS or any(self._buffer[1:4]) or size > MAX_LOG_FRAME:
+                _LOGGER.warning("Log stream of {} is not multiplexed, reading it as raw output".format(
+                    self.name
+                ))
+                self.multiplexed = False
+                data = bytes(self._buffer)
+                self._buffer.clear()
+                return lines + self._split('stdout', data)
+            if len(self._buffer) < HEADER_SIZE + size:
+                break
+            stream = STREAMS.get(self._buffer[0], 'stdout')
+            payload = bytes(self._buffer[HEADER_SIZE:HEADER_SIZE + size])
+            del self._buffer[:HEADER_SIZE + size]
+            lines += self._split(stream, payload)
+        return lines
+
+    def _split(self, stream, data):
+        *complete, partial = (self._partial.pop(stream, b'') + data).split(b'\n')
+        if partial:
+            self._partial[stream] = partial[:MAX_LOG_LINE]
+        return [
+            (stream, line[:MAX_LOG_LINE].decode('utf-8', 'replace').rstrip('\r'))
+            for line in complete
+        ]
+
+
+class LogPatterns:
+    """Regular expressions to match log lines against.
+
+    The patterns are combined into one alternation, so a line that matches
+    none of them, i.e. nearly every line, costs a single search. Patterns
+    with back references are searched on their own, as the group numbers
+    change when combined.
+    """
+
+    def __init__(self, patterns):
+        self.patterns = []
+        self._combined = []
+        self._separate = []
+        for pattern in patterns:
+            try:
+                regex = re.compile(pattern)
+            except re.error as e:
+                _LOGGER.error("Invalid log pattern {} ({})".format(pattern, e))
+                continue
+            self.patterns.append(pattern)
+            if BACK_REFERENCE.search(pattern):
+                self._separate.append((pattern, regex))
+            else:
+                self._combined.append((pattern, regex))
+        self._any = re.compile(
+            '|'.join('(?:{})'.format(pattern) for pattern, _ in self._combined)
+        ) if self._combined else None
+
+    def __bool__(self):
+        return bool(self.patterns)
+
+    def search(self, text):
+        """Return the patterns found in a line."""
+        found = []
+        if self._any is not None and self._any.search(text):
+            found = [pattern for pattern, regex in self._combined if regex.search(text)]
+        return found + [pattern for pattern, regex in self._separate if regex.search(text)]
+
+
+class LogWatcher:
+    """Follow the log stream of a container from the time it is started.
+
+    Only the last lines are kept, in a ring buffer. After an interruption
+    the stream continues after the last line seen, so no history is fetched
+    twice. The entities of the container are notified of new lines at most
+    once per LOG_WRITE_INTERVAL, so a chatty container does not write its
+    state on every dispatch; the events of the matches fire at once.
+    """
+
+    def __init__(self, container, lines=DEFAULT_LOG_LINES):
+        self.container = container
+        self.lines = deque(maxlen=lines)
+        self.matches = {}
+        self.match_count = 0
+        self._last_timestamp = None
+        self._notified = None
+        self._notify_handle = None
+
+    @property
+    def last_line(self):
+        return self.lines[-1] if self.lines else None
+
+    async def async_follow(self):
+        host = self.container.host
+        since = '{:.9f}'.format(time.time())
+        try:
+            while True:
+                demuxer = LogDemuxer(multiplexed=not self.container.tty, name=self.container.name)
+                try:
+                    async for chunk in host.api.logs(self.container.id, since=since):
+                        for stream, line in demuxer.feed(chunk):
+                            self.process(stream, line)
+                except DockerApiError as e:
+                    _LOGGER.debug("Log stream of {} failed ({})".format(self.container.name, e))
+                if self._last_timestamp is not None:
+                    since = next_since(self._last_timestamp)
+                await asyncio.sleep(EVENTS_RETRY_INTERVAL)
+        finally:
+            # A stopped container is marked changed by its status anyway
+            self._cancel_notify()
+
+    def process(self, stream, line):
+        """Keep a timestamped line and fire an event for each pattern it matches."""
+        timestamp, _, text = line.partition(' ')
+        self._last_timestamp = timestamp
+        self.lines.append(text)
+        self._notify()
+        host = self.container.host
+        for pattern in host.log_patterns.search(text):
+            self.matches[pattern] = self.matches.get(pattern, 0) + 1
+            self.match_count += 1
+            host.hass.bus.async_fire(EVENT_LOG_MATCH, {
+                'host': host.config_entry.data[CONF_NAME],
+                'container': self.container.name,
+                'pattern': pattern,
+                'stream': stream,
+                'line': text
+            })
+
+    def _notify(self):
+        """Mark the container as changed, or schedule it for the end of the interval."""
+        now = time.monotonic()
+        if self._notified is None or now - self._notified >= LOG_WRITE_INTERVAL:
+            self._notified = now
+            self.container.host.dirty.add(self.container.name)
+        elif self._notify_handle is None:
+            self._notify_handle = self.container.host.hass.loop.call_later(
+                self._notified + LOG_WRITE_INTERVAL - now, self._notify_later
+            )
+
+    def _notify_later(self):
+        self._notify_handle = None
+        self._notified = time.monotonic()
+        self.container.host.dirty.add(self.container.name)
+
+    def _cancel_notify(self):
+        if self._notify_handle is not None:
+            self._notify_handle.cancel()
+            self._notify_handle = None
@@ -0,0 +1,97 @@
+"""Performance instrumentation of the refresh cycles."""
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+# Resolution of the timings, in seconds
+TIMING_PRECISION = 4
+
+
+class CycleMetrics:
+    """Phase timings of the last refresh cycle of a host, and running totals.
+
+    The phases are the version call, the container list, the per-container
+    refreshes (as percentiles of their durations), and the dispatch to the
+    entities, which includes their state writes. The time refreshes spend
+    waiting for a concurrency slot is kept separately, as the queue wait.
+    """
+
+    def __init__(self):
+        self.cycles = 0
+        self.cycle_errors = 0
+        self.entity_writes = 0
+        self.phases = {}
+        self._refresh_times = []
+        self._queue_waits = []
+        self._cycle_writes = 0
+
+    def start_cycle(self):
+        """Forget the timings of the previous cycle."""
+        self.cycles += 1
+        self.phases = {}
+        self._refresh_times = []
+        self._queue_waits = []
+        self._cycle_writes = 0
+
+    @contextmanager
+    def phase(self, name):
+        """Time a phase of the current cycle."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0) + time.perf_counter() - start
+
+    def add_refresh(self, wait, duration):
+        """Record the queue wait and duration of one container refresh."""
+        self._queue_waits.append(wait)
+        self._refresh_times.append(duration)
+
+    def count_error(self):
+        self.cycle_errors += 1
+
+    def count_write(self):
+        """Record an entity state write."""
+        self.entity_writes += 1
+        self._cycle_writes += 1
+
+    def get_info(self, api=None):
+        """Return the figures of the last cycle and the totals."""
+        info = {
+            'cycles': self.cycles,
+            'cycle_errors': self.cycle_errors,
+            'entity_writes': self.entity_writes,
+            'cycle_writes': self._cycle_writes,
+            'refresh_count': len(self._refresh_times),
+            'version_time': None,
+            'list_time': None,
+            'dispatch_time': None,
+            'refresh_p50': None,
+            'refresh_p95': None,
+            'refresh_max': None,
+            'queue_wait_max': None
+        }
+        for name, duration in self.phases.items():
+            info['{}_time'.format(name)] = round(duration, TIMING_PRECISION)
+        if self._refresh_times:
+            p50, p95, highest = np.percentile(self._refresh_times, [50, 95, 100])
+            info['refresh_p50'] = round(float(p50), TIMING_PRECISION)
+            info['refresh_p95'] = round(float(p95), TIMING_PRECISION)
+            info['refresh_max'] = round(float(highest), TIMING_PRECISION)
+            info['queue_wait_max'] = round(max(self._queue_waits), TIMING_PRECISION)
+        if api is not None:
+            info['api_calls'] = sum(api.calls.values())
+            info['api_errors'] = sum(api.errors.values())
+        return info
+
+    def get_diagnostics(self, api=None):
+        """Return everything, including the calls and errors per endpoint."""
+        info = self.get_info(api)
+        info['phases'] = {
+            name: round(duration, TIMING_PRECISION) for name, duration in self.phases.items()
+        }
+        if api is not None:
+            info['api_calls_by_endpoint'] = dict(api.calls)
+            info['api_errors_by_endpoint'] = dict(api.errors)
+        return info
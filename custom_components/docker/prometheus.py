@@ -0,0 +1,235 @@
+"""Prometheus exposition of the container registries of the Docker hosts."""
+from datetime import datetime
+
+from aiohttp import web
+
+from homeassistant.const import CONF_NAME
+import homeassistant.util.dt as dt_util
+
+from .const import DOMAIN, METRICS_URL
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+BYTES_PER_MIB = 1024 * 1024
+BYTES_PER_MB = 1000 * 1000
+
+
+def _started(container, info):
+    uptime = container.uptime
+    if isinstance(uptime, str):
+        uptime = dt_util.parse_datetime(uptime)
+    # Containers that never started report the zero time
+    if not isinstance(uptime, datetime) or uptime.year < 1970:
+        return None
+    return uptime.timestamp()
+
+
+def _scaled(key, factor):
+    def value(container, info):
+        return info[key] * factor if info.get(key) is not None else None
+    return value
+
+
+def _host_value(key, factor=1):
+    def value(host, info):
+        return info[key] * factor if info.get(key) is not None else None
+    return value
+
+
+# Name, type, help and value of the families with a sample per container.
+# A value of None leaves the sample out.
+CONTAINER_FAMILIES = [
+    ('docker_container_running', 'gauge', "1 if the container is running.",
+     lambda container, info: 1 if container.state else 0),
+    ('docker_container_started_seconds', 'gauge', "Last start time of the container, in seconds since the epoch.",
+     _started),
+    ('docker_container_restart_count', 'gauge', "Restarts of the container by its restart policy.",
+     lambda container, info: container.restart_count),
+    ('docker_container_exit_code', 'gauge', "Exit code of the last run of the container.",
+     lambda container, info: container.exit_code),
+    ('docker_container_healthy', 'gauge', "1 if the health check passes, 0 if it fails; absent without one.",
+     lambda container, info: None if container.health in (None, 'starting') else int(container.health == 'healthy')),
+    ('docker_container_cpu_percent', 'gauge', "CPU usage of the container, in percent of one CPU.",
+     _scaled('container_cpu_percent', 1)),
+    ('docker_container_memory_usage_bytes', 'gauge', "Memory used by the container.",
+     _scaled('container_memory_usage', BYTES_PER_MIB)),
+    ('docker_container_memory_limit_bytes', 'gauge', "Memory limit of the container.",
+     _scaled('container_memory_limit', BYTES_PER_MIB)),
+    ('docker_container_network_receive_bytes_per_second', 'gauge', "Network receive rate of the container.",
+     _scaled('container_network_rx', 1000)),
+    ('docker_container_network_transmit_bytes_per_second', 'gauge', "Network transmit rate of the container.",
+     _scaled('container_network_tx', 1000)),
+    ('docker_container_block_read_bytes_per_second', 'gauge', "Block device read rate of the container.",
+     _scaled('container_block_read', 1000)),
+    ('docker_container_block_write_bytes_per_second', 'gauge', "Block device write rate of the container.",
+     _scaled('container_block_write', 1000))
+]
+
+# The same, with a sample per host
+HOST_FAMILIES = [
+    ('docker_host_up', 'gauge', "1 if the Docker host is reachable.",
+     lambda host, info: 1 if host.available else 0),
+    ('docker_host_containers_running', 'gauge', "Containers running on the host.",
+     _host_value('containers_running')),
+    ('docker_host_containers_paused', 'gauge', "Containers paused on the host.",
+     _host_value('containers_paused')),
+    ('docker_host_containers_stopped', 'gauge', "Containers stopped on the host.",
+     _host_value('containers_stopped')),
+    ('docker_host_images', 'gauge', "Images on the host.",
+     _host_value('images')),
+    ('docker_host_images_size_bytes', 'gauge', "Disk space used by the images.",
+     _host_value('images_size', BYTES_PER_MB)),
+    ('docker_host_volumes_size_bytes', 'gauge', "Disk space used by the volumes in use.",
+     _host_value('volumes_size', BYTES_PER_MB)),
+    ('docker_host_image_updates', 'gauge', "Images in use with a newer version in their registry.",
+     _host_value('image_updates'))
+]
+
+# Families whose samples carry their value in a label
+INFO_FAMILIES = [
+    ('docker_container_info', 'gauge', "Image, status and group of the container, as labels."),
+    ('docker_host_info', 'gauge', "Versions of the Docker host, as labels.")
+]
+CONTAINER_INFO, HOST_INFO = range(len(INFO_FAMILIES))
+
+
+def escape(value):
+    """Escape a label value."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def labels(**values):
+    return ','.join('{}="{}"'.format(key, escape(value)) for key, value in values.items() if value is not None)
+
+
+def sample(name, label_text, value):
+    return '{}{{{}}} {}\n'.format(name, label_text, repr(float(value))).encode()
+
+
+def header(name, kind, description):
+    return '# HELP {} {}\n# TYPE {} {}\n'.format(name, description, name, kind).encode()
+
+
+class PrometheusExporter:
+    """The samples of one host, kept up to date with the dispatches.
+
+    Each family keeps a rendered line per container, and only the lines of
+    the containers the dispatch reports as changed are rendered again. The
+    lines of a family are joined once after they change, so a scrape writes
+    out ready bytes and neither calls the Docker API nor formats anything.
+    """
+
+    def __init__(self, host):
+        self.host = host
+        self._lines = [{} for _ in range(len(CONTAINER_FAMILIES) + 1)]
+        self._blocks = [b''] * (len(CONTAINER_FAMILIES) + 1)
+        self._stale = set()
+        self._host_lines = [b''] * len(HOST_FAMILIES)
+        self._host_info = b''
+
+    def update(self, names, host_changed):
+        """Render the lines of the containers (and the host) that changed."""
+        host_name = self.host.config_entry.data[CONF_NAME]
+        for name in names:
+            container = self.host.get_container(name)
+            if container is None:
+                self.remove([name])
+                continue
+            info = container.get_info()
+            label_text = labels(host=host_name, container=name)
+            for index, (family, _, _, value) in enumerate(CONTAINER_FAMILIES):
+                number = value(container, info)
+                self._set(index, name, None if number is None else sample(family, label_text, number))
+            self._set(len(CONTAINER_FAMILIES), name, sample(
+                INFO_FAMILIES[CONTAINER_INFO][0],
+                labels(
+                    host=host_name, container=name, image=container.image,
+                    status=container.status, group=container.group
+                ),
+                1
+            ))
+        if host_changed:
+            info = self.host.get_info()
+            label_text = labels(host=host_name)
+            for index, (family, _, _, value) in enumerate(HOST_FAMILIES):
+                number = value(self.host, info)
+                self._host_lines[index] = b'' if number is None else sample(family, label_text, number)
+            versions = self.host.version_info
+            self._host_info = sample(INFO_FAMILIES[HOST_INFO][0], labels(
+                host=host_name, version=versions.get('version'), api_version=versions.get('api_version'),
+                os=versions.get('os'), arch=versions.get('arch'), kernel=versions.get('kernel')
+            ), 1)
+
+    def remove(self, names):
+        """Drop the lines of containers that were destroyed."""
+        for index, lines in enumerate(self._lines):
+            for name in names:
+                if lines.pop(name, None) is not None:
+                    self._stale.add(index)
+
+    def _set(self, index, name, line):
+        lines = self._lines[index]
+        if line is None:
+            if lines.pop(name, None) is not None:
+                self._stale.add(index)
+        elif lines.get(name) != line:
+            lines[name] = line
+            self._stale.add(index)
+
+    def get_container_block(self, index):
+        """Return the joined lines of a container family."""
+        if index in self._stale:
+            self._blocks[index] = b''.join(self._lines[index].values())
+            self._stale.discard(index)
+        return self._blocks[index]
+
+    def get_host_line(self, index):
+        return self._host_lines[index]
+
+    def get_host_info(self):
+        return self._host_info
+
+
+def render(exporters):
+    """Yield the exposition in chunks, a family at a time, over all hosts."""
+    for index, (family, kind, description, _) in enumerate(HOST_FAMILIES):
+        yield header(family, kind, description) + b''.join(
+            exporter.get_host_line(index) for exporter in exporters
+        )
+    family, kind, description = INFO_FAMILIES[HOST_INFO]
+    yield header(family, kind, description) + b''.join(exporter.get_host_info() for exporter in exporters)
+    for index, (family, kind, description, _) in enumerate(CONTAINER_FAMILIES):
+        yield header(family, kind, description) + b''.join(
+            exporter.get_container_block(index) for exporter in exporters
+        )
+    family, kind, description = INFO_FAMILIES[CONTAINER_INFO]
+    yield header(family, kind, description) + b''.join(
+        exporter.get_container_block(len(CONTAINER_FAMILIES)) for exporter in exporters
+    )
+
+
+def register_view(hass):
+    """Serve the samples of every host with the exporter enabled.
+
+    The HTTP component is only imported here, so that loading the integration
+    does not load it.
+    """
+    from homeassistant.components.http import HomeAssistantView
+
+    class DockerMetricsView(HomeAssistantView):
+        url = METRICS_URL
+        name = 'api:docker:metrics'
+
+        async def get(self, request):
+            hass = request.app['hass']
+            exporters = [
+                host.exporter for host in hass.data.get(DOMAIN, {}).values() if host.exporter is not None
+            ]
+            response = web.StreamResponse(headers={'Content-Type': CONTENT_TYPE})
+            await response.prepare(request)
+            for chunk in render(exporters):
+                await response.write(chunk)
+            await response.write_eof()
+            return response
+
+    hass.http.register_view(DockerMetricsView)
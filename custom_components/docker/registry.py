@@ -0,0 +1,146 @@
+"""Asynchronous client for the manifest digests of images in their registries."""
+import asyncio
+import re
+import time
+from collections import Counter
+from urllib.parse import urlparse
+
+import aiohttp
+
+from .const import (
+    REGISTRY_TIMEOUT,
+    REGISTRY_MIN_INTERVAL,
+    REGISTRY_TOKEN_LIFETIME
+)
+
+DOCKER_HUB = 'registry-1.docker.io'
+DOCKER_HUB_NAMES = ('docker.io', 'index.docker.io', DOCKER_HUB)
+
+# Registries the daemon talks plain HTTP to without being configured to
+INSECURE_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+# Manifest lists first, so multi-platform tags report the digest they are pulled by
+MANIFEST_TYPES = ', '.join([
+    'application/vnd.oci.image.index.v1+json',
+    'application/vnd.docker.distribution.manifest.list.v2+json',
+    'application/vnd.docker.distribution.manifest.v2+json',
+    'application/vnd.oci.image.manifest.v1+json'
+])
+
+CHALLENGE_PARAM = re.compile(r'(\w+)="([^"]*)"')
+IMAGE_ID = re.compile(r'^(sha256:)?[0-9a-f]{64}$')
+
+
+class RegistryError(Exception):
+    """Error returned by, or while talking to, an image registry."""
+
+
+def parse_reference(image):
+    """Split an image reference into registry, repository and tag.
+
+    Follows the daemon's defaults: no registry means Docker Hub, where
+    official images live under library/, and no tag means latest. Returns
+    None for references that cannot have a newer version, i.e. image IDs
+    and references pinned to a digest.
+    """
+    if not image or '@' in image or IMAGE_ID.match(image):
+        return None
+    name, tag = image, 'latest'
+    if ':' in image.rpartition('/')[2]:
+        name, _, tag = image.rpartition(':')
+    registry, _, repository = name.partition('/')
+    if not repository or ('.' not in registry and ':' not in registry and registry != 'localhost'):
+        registry, repository = DOCKER_HUB, name
+    elif registry in DOCKER_HUB_NAMES:
+        registry = DOCKER_HUB
+    if registry == DOCKER_HUB and '/' not in repository:
+        repository = 'library/' + repository
+    return registry, repository, tag
+
+
+class RegistryClient:
+    """Looks up the current manifest digest of image tags.
+
+    Only HEAD requests are sent, which registries do not count as pulls.
+    Anonymous bearer tokens are fetched when a registry asks for one, and
+    kept until they expire. Requests to the same registry are spaced by
+    min_interval seconds, so checking many images does not run into the
+    rate limits of public registries.
+    """
+
+    def __init__(self, session, min_interval=REGISTRY_MIN_INTERVAL, timeout=REGISTRY_TIMEOUT):
+        self.session = session
+        self.min_interval = min_interval
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        # Requests per registry, for the diagnostics
+        self.calls = Counter()
+        self._tokens = {}
+        self._next_request = {}
+
+    @staticmethod
+    def base_url(registry):
+        scheme = 'http' if urlparse('//' + registry).hostname in INSECURE_HOSTS else 'https'
+        return '{}://{}'.format(scheme, registry)
+
+    async def _throttle(self, registry):
+        """Wait for the next free request slot of a registry."""
+        now = time.monotonic()
+        at = max(now, self._next_request.get(registry, now))
+        self._next_request[registry] = at + self.min_interval
+        self.calls[registry] += 1
+        if at > now:
+            await asyncio.sleep(at - now)
+
+    async def digest(self, registry, repository, tag):
+        """Return the digest the registry currently has for a tag."""
+        url = '{}/v2/{}/manifests/{}'.format(self.base_url(registry), repository, tag)
+        token = self._get_token(registry, repository)
+        authenticated = False
+        while True:
+            headers = {'Accept': MANIFEST_TYPES}
+            if token is not None:
+                headers['Authorization'] = 'Bearer ' + token
+            await self._throttle(registry)
+            try:
+                async with self.session.head(url, headers=headers, timeout=self.timeout) as response:
+                    status = response.status
+                    digest = response.headers.get('Docker-Content-Digest')
+                    challenge = response.headers.get('WWW-Authenticate', '')
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                raise RegistryError("HEAD {} failed ({})".format(url, e)) from e
+            if status == 401 and not authenticated and challenge.lower().startswith('bearer '):
+                # No token yet, or the cached one was revoked
+                token = await self._async_token(registry, repository, challenge)
+                authenticated = True
+                continue
+            if status >= 400:
+                raise RegistryError("HEAD {}: {}".format(url, status))
+            if not digest:
+                raise RegistryError("HEAD {}: no digest".format(url))
+            return digest
+
+    def _get_token(self, registry, repository):
+        token, expires = self._tokens.get((registry, repository), (None, 0))
+        return token if expires > time.monotonic() else None
+
+    async def _async_token(self, registry, repository, challenge):
+        """Get an anonymous pull token from the realm of a bearer challenge."""
+        params = dict(CHALLENGE_PARAM.findall(challenge))
+        realm = params.pop('realm', None)
+        if realm is None:
+            raise RegistryError("{} sent no token realm".format(registry))
+        params.setdefault('scope', 'repository:{}:pull'.format(repository))
+        await self._throttle(registry)
+        try:
+            async with self.session.get(realm, params=params, timeout=self.timeout) as response:
+                if response.status >= 400:
+                    raise RegistryError("GET {}: {}".format(realm, response.status))
+                data = await response.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            raise RegistryError("GET {} failed ({})".format(realm, e)) from e
+        token = data.get('token') or data.get('access_token')
+        if not token:
+            raise RegistryError("GET {}: no token".format(realm))
+        lifetime = data.get('expires_in') or REGISTRY_TOKEN_LIFETIME
+        self._tokens[(registry, repository)] = (token, time.monotonic() + lifetime)
+        return token
@@ -1,24 +1,26 @@
 """Support for Docker sensors."""
 import logging
-from typing import Any, Dict
 
-from . import DockerContainer
+from .entity import DockerHostEntity, DockerContainerEntity, DockerGroupEntity
 from .const import (
     DOMAIN,
-    DOCKER_CLIENT,
-    DATA_HOST,
-    DATA_VERSION_INFO,
     DATA_UPDATED,
-    CONF_CONTAINERS,
+    DIAGNOSTICS_UPDATED,
+    CONTAINERS_ADDED,
+    GROUPS_ADDED,
     HOST_MON_COND,
+    DIAGNOSTIC_MON_COND,
     CREATE_SENSORS,
-    CONTAINER_MON_COND
+    CONTAINER_MON_COND,
+    LOG_MON_COND,
+    UPDATE_MON_COND,
+    CONF_DIAGNOSTICS,
+    DEFAULT_DIAGNOSTICS
 )
 
 from homeassistant.core import callback
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.helpers.entity import Entity
-from homeassistant.exceptions import PlatformNotReady
+from homeassistant.helpers.entity import EntityCategory
 from homeassistant.helpers.typing import HomeAssistantType
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.const import (
@@ -32,50 +34,87 @@ async def async_setup_entry(
     hass: HomeAssistantType, config_entry: ConfigEntry, async_add_entities
 ) -> None:
     """Set up the Docker Sensor."""
+    host = hass.data[DOMAIN][config_entry.entry_id]
     sensors = [DockerHostSensor(
         hass = hass, 
-        api = hass.data[DOCKER_CLIENT][DATA_HOST], 
+        api = host, 
         clientname = config_entry.data[CONF_NAME], 
         variable = variable
-    ) for variable in HOST_MON_COND]
+    ) for variable in HOST_MON_COND if variable not in UPDATE_MON_COND or host.update_checks]
+
+    if config_entry.options.get(CONF_DIAGNOSTICS, DEFAULT_DIAGNOSTICS):
+        sensors += [DockerDiagnosticSensor(
+            hass = hass, 
+            api = host, 
+            clientname = config_entry.data[CONF_NAME], 
+            variable = variable
+        ) for variable in DIAGNOSTIC_MON_COND]
 
     conditions = config_entry.data.get(CONF_MONITORED_CONDITIONS, CONTAINER_MON_COND)
     if type(conditions) is str:
         conditions = conditions.split(',') 
 
-    if config_entry.data[CREATE_SENSORS]:
-        for container in hass.data[DOCKER_CLIENT][CONF_CONTAINERS]:
+    def create_sensors(names):
+        sensors = []
+        for container in names:
             sensors += [DockerContainerSensor(
                 hass = hass, 
-                api = hass.data[DOCKER_CLIENT][DATA_HOST], 
+                api = host, 
                 clientname = config_entry.data[CONF_NAME], 
                 container_name = container, 
                 variable = variable.strip()
-            ) for variable in conditions if variable.strip() in CONTAINER_MON_COND]
+            ) for variable in conditions if variable.strip() in CONTAINER_MON_COND and (
+                variable.strip() not in LOG_MON_COND or host.follows_logs(container)
+            )]
+        return sensors
+
+    @callback
+    def async_containers_added(names):
+        """Add the sensors of containers that appeared."""
+        async_add_entities(create_sensors(names), True)
+
+    if config_entry.data[CREATE_SENSORS]:
+        sensors += create_sensors(host.container_names)
+        host.unsub_listeners.append(async_dispatcher_connect(
+            hass, CONTAINERS_ADDED.format(config_entry.entry_id), async_containers_added
+        ))
+
+    def create_group_sensors(groups):
+        return [DockerGroupSensor(
+            hass = hass,
+            api = host,
+            clientname = config_entry.data[CONF_NAME],
+            group = group
+        ) for group in groups]
+
+    @callback
+    def async_groups_added(groups):
+        """Add the sensors of groups that appeared."""
+        async_add_entities(create_group_sensors(groups), True)
 
-    if sensors:
-        async_add_entities(sensors, True)
-    else:
-        _LOGGER.info("No containers setup")
-        return False
+    if host.groups_enabled:
+        sensors += create_group_sensors(host.groups)
+        host.unsub_listeners.append(async_dispatcher_connect(
+            hass, GROUPS_ADDED.format(config_entry.entry_id), async_groups_added
+        ))
 
-class DockerHostSensor(Entity):
+    async_add_entities(sensors, True)
+
+class DockerHostSensor(DockerHostEntity):
     """Representation of a Docker Sensor."""
 
+    _conditions = HOST_MON_COND
+
     def __init__(self, hass, api, clientname, variable):
         """Initialize the sensor."""
-        self._hass = hass
-        self._api = api
-        self._clientname = clientname
+        super().__init__(hass, api, clientname)
         self._info = None
-        self._state = None
-        self._attributes = {}
         self._var_id = variable
-        self._var_name = HOST_MON_COND[variable][0]
-        self._var_unit = HOST_MON_COND[variable][1]
-        self._var_icon = HOST_MON_COND[variable][2]
-        self._var_class = HOST_MON_COND[variable][3]
-        self._var_attr = HOST_MON_COND[variable][4]
+        self._var_name = self._conditions[variable][0]
+        self._var_unit = self._conditions[variable][1]
+        self._var_icon = self._conditions[variable][2]
+        self._var_class = self._conditions[variable][3]
+        self._var_attr = self._conditions[variable][4]
 
     @property
     def unique_id(self) -> str:
@@ -107,58 +146,49 @@ class DockerHostSensor(Entity):
         """Return the unit the value is expressed in."""
         return self._var_unit
 
-    async def async_added_to_hass(self):
-        """Handle entity which will be added."""
-        self.unsub_update = async_dispatcher_connect(
-            self._hass, DATA_UPDATED, self._schedule_immediate_update
-        )
+    def _update_state(self):
+        super()._update_state()
+        self._state = self._value()
 
-    @callback
-    def _schedule_immediate_update(self):
-        self.async_schedule_update_ha_state(True)
+    def _value(self):
+        self._info = self._api.get_info()
+        return self._info.get(self._var_attr, None)
 
-    async def async_update(self) -> None:
-        self._info = self.hass.data[DOCKER_CLIENT][DATA_VERSION_INFO]
-        self._state = self._info.get(self._var_attr, None)
+class DockerDiagnosticSensor(DockerHostSensor):
+    """Representation of a Docker refresh cycle figure."""
 
-    @property
-    def device_state_attributes(self):
-        """Return the state attributes."""
-        return self._attributes
+    _conditions = DIAGNOSTIC_MON_COND
+
+    def _signals(self):
+        entry_id = self._api.config_entry.entry_id
+        # The host signal for the availability of the host
+        return [DIAGNOSTICS_UPDATED.format(entry_id), DATA_UPDATED.format(entry_id)]
 
     @property
-    def device_info(self) -> Dict[str, Any]:
-        """Return device information about this Docker host instance."""
-        return {
-            "identifiers": {
-                (DOMAIN, self._clientname)
-            },
-            "name": self._clientname,
-            "manufacturer": "Docker",
-            "model": "Host",
-            "sw_version": self.hass.data[DOCKER_CLIENT][DATA_VERSION_INFO]["version"]
-        }
+    def entity_category(self):
+        """Return the category, as the figures describe the integration."""
+        return EntityCategory.DIAGNOSTIC
+
+    def _value(self):
+        return self._api.diagnostics_info.get(self._var_attr, None)
 
-class DockerContainerSensor(Entity):
+    def _count_write(self):
+        # Only the writes of the monitored entities are of interest
+        pass
+
+class DockerContainerSensor(DockerContainerEntity):
     """Representation of a Docker Sensor."""
 
     def __init__(self, hass, api, clientname, container_name, variable):
         """Initialize the sensor."""
-        self._hass = hass
-        self._api = api
+        super().__init__(hass, api, clientname, container_name)
         self._info = None
-        self._clientname = clientname
-        self._container_name = container_name
 
         self._var_id = variable
         self._var_name = CONTAINER_MON_COND[variable][0]
         self._var_unit = CONTAINER_MON_COND[variable][1]
         self._var_icon = CONTAINER_MON_COND[variable][2]
         self._var_class = CONTAINER_MON_COND[variable][3]
-        self._attributes = {}
-
-        self._state = None
-        self._container = api.get_container(container_name)
 
         _LOGGER.info("Initializing Docker sensor \"{}\" with parameter: {}".format(
             self._container_name, self._var_name))
@@ -178,10 +208,6 @@ class DockerContainerSensor(Entity):
         """Icon to use in the frontend, if any."""
         return self._var_icon
 
-    @property
-    def should_poll(self):
-        return False
-
     @property
     def state(self):
         """Return the state of the sensor."""
@@ -197,33 +223,37 @@ class DockerContainerSensor(Entity):
         """Return the unit the value is expressed in."""
         return self._var_unit
 
-    async def async_added_to_hass(self):
-        """Handle entity which will be added."""
-        self.unsub_update = async_dispatcher_connect(
-            self._hass, DATA_UPDATED, self._schedule_immediate_update
-        )
+    def _update_container(self, container):
+        self._state = container.get_info().get(self._var_id, None)
 
-    @callback
-    def _schedule_immediate_update(self):
-        self.async_schedule_update_ha_state(True)
+class DockerGroupSensor(DockerGroupEntity):
+    """Representation of a compose project or swarm service, as its running containers."""
 
-    async def async_update(self) -> None:
-        self._state = self._container.get_info().get(self._var_id, None)
+    @property
+    def unique_id(self) -> str:
+        """Return the unique ID for this sensor."""
+        return "docker_{}_group_{}".format(self._clientname, self._group)
 
     @property
-    def device_state_attributes(self):
-        """Return the state attributes."""
-        return self._attributes
+    def name(self):
+        """Return the name of the sensor."""
+        return "{} Running".format(self._group.title())
 
     @property
-    def device_info(self) -> Dict[str, Any]:
-        """Return device information about this Docker host instance."""
-        return {
-            "identifiers": {
-                (DOMAIN, self._clientname, self._container_name)
-            },
-            "name": self._container_name.title(),
-            "manufacturer": "Docker",
-            "model": "Container",
-            "sw_version": self.hass.data[DOCKER_CLIENT][DATA_VERSION_INFO]["version"]
-        }
\ No newline at end of file
+    def icon(self):
+        return 'mdi:docker'
+
+    @property
+    def state(self):
+        """Return the number of running containers."""
+        return self._state
+
+    def _written(self):
+        # The totals and members are attributes
+        return super()._written() + (self._attributes,)
+
+    def _update_state(self):
+        super()._update_state()
+        info = self._get_group()
+        self._state = info['running']
+        self._attributes = {key: value for key, value in info.items() if key != 'running'}
@@ -0,0 +1,195 @@
+"""Resource metrics computed from the Docker stats streams."""
+import numpy as np
+
+from .const import PRECISION
+
+BYTES_PER_MIB = 1024 * 1024
+BYTES_PER_KB = 1000
+
+# Raw counters kept per container slot
+COUNTERS = (
+    'time', 'cpu', 'system', 'online_cpus', 'memory', 'memory_limit',
+    'rx', 'tx', 'read', 'write'
+)
+TIME, CPU, SYSTEM, ONLINE_CPUS, MEMORY, MEMORY_LIMIT, RX, TX, READ, WRITE = range(len(COUNTERS))
+
+# Derived metrics, in the column order of the computed results
+METRICS = (
+    'container_cpu_percent',
+    'container_memory_usage',
+    'container_memory_limit',
+    'container_memory_percent',
+    'container_network_rx',
+    'container_network_tx',
+    'container_block_read',
+    'container_block_write'
+)
+
+DEFAULT_CAPACITY = 64
+
+
+def parse_sample(sample, timestamp):
+    """Extract the raw counters of a stats sample, in COUNTERS order."""
+    cpu_stats = sample.get('cpu_stats', {})
+    cpu_usage = cpu_stats.get('cpu_usage', {})
+    online_cpus = cpu_stats.get('online_cpus') or len(cpu_usage.get('percpu_usage') or []) or 1
+
+    memory_stats = sample.get('memory_stats', {})
+    memory = memory_stats.get('usage', np.nan)
+    stats = memory_stats.get('stats', {})
+    memory -= stats.get('inactive_file', stats.get('total_inactive_file', stats.get('cache', 0)))
+
+    rx = tx = 0
+    for network in (sample.get('networks') or {}).values():
+        rx += network.get('rx_bytes', 0)
+        tx += network.get('tx_bytes', 0)
+
+    read = write = 0
+    for entry in (sample.get('blkio_stats') or {}).get('io_service_bytes_recursive') or []:
+        op = entry.get('op', '').lower()
+        if op == 'read':
+            read += entry.get('value', 0)
+        elif op == 'write':
+            write += entry.get('value', 0)
+
+    return (
+        timestamp,
+        cpu_usage.get('total_usage', np.nan),
+        cpu_stats.get('system_cpu_usage', np.nan),
+        online_cpus,
+        memory,
+        memory_stats.get('limit', np.nan),
+        rx, tx, read, write
+    )
+
+
+class StatsTable:
+    """Stats counters of all containers on a host, packed by container slot.
+
+    Stream samples only store their raw counters in the slot of their
+    container. The metrics of every container with new samples are derived
+    in one vectorized pass per cycle, from the counters at the previous pass.
+    The host totals of the metrics are kept up to date from the changes of
+    those slots only.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self._current = np.full((capacity, len(COUNTERS)), np.nan)
+        self._previous = np.full((capacity, len(COUNTERS)), np.nan)
+        self._results = np.full((capacity, len(METRICS)), np.nan)
+        self._fresh = np.zeros(capacity, dtype=bool)
+        self._rows = self._results.tolist()
+        self._owners = [None] * capacity
+        self._free = list(range(capacity - 1, -1, -1))
+        self._totals = np.zeros(len(METRICS))
+        self._computed = np.zeros(0, dtype=int)
+
+    def _grow(self):
+        capacity = len(self._fresh)
+        self._current = np.vstack((self._current, np.full_like(self._current, np.nan)))
+        self._previous = np.vstack((self._previous, np.full_like(self._previous, np.nan)))
+        self._results = np.vstack((self._results, np.full_like(self._results, np.nan)))
+        self._fresh = np.concatenate((self._fresh, np.zeros(capacity, dtype=bool)))
+        self._rows.extend([[np.nan] * len(METRICS) for _ in range(capacity)])
+        self._owners.extend([None] * capacity)
+        self._free.extend(range(2 * capacity - 1, capacity - 1, -1))
+
+    def allocate(self, owner):
+        """Reserve a slot for a container."""
+        if not self._free:
+            self._grow()
+        slot = self._free.pop()
+        self._owners[slot] = owner
+        return slot
+
+    def release(self, slot):
+        """Clear a slot and make it available again."""
+        self._totals -= np.nan_to_num(self._results[slot])
+        self._current[slot] = np.nan
+        self._previous[slot] = np.nan
+        self._results[slot] = np.nan
+        self._fresh[slot] = False
+        self._rows[slot] = [np.nan] * len(METRICS)
+        self._owners[slot] = None
+        self._free.append(slot)
+
+    def update(self, slot, sample, timestamp):
+        """Store the counters of a stats sample received at the (monotonic) timestamp."""
+        self._current[slot] = parse_sample(sample, timestamp)
+        self._fresh[slot] = True
+
+    def compute(self):
+        """Derive the metrics of every slot with new samples since the last pass.
+
+        Returns the owners of the slots whose metrics changed.
+        """
+        slots = self._computed = np.flatnonzero(self._fresh)
+        if not len(slots):
+            return []
+        current = self._current[slots]
+        previous = self._previous[slots]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            system = current[:, SYSTEM] - previous[:, SYSTEM]
+            cpu = np.clip(current[:, CPU] - previous[:, CPU], 0, None)
+            cpu_percent = np.where(system > 0, cpu / system * current[:, ONLINE_CPUS] * 100, np.nan)
+
+            memory_percent = np.where(
+                current[:, MEMORY_LIMIT] > 0,
+                current[:, MEMORY] / current[:, MEMORY_LIMIT] * 100,
+                np.nan
+            )
+
+            # Counters reset when the container restarts
+            elapsed = current[:, TIME] - previous[:, TIME]
+            rates = np.clip(current[:, RX:] - previous[:, RX:], 0, None) / elapsed[:, None] / BYTES_PER_KB
+            rates[~(elapsed > 0)] = np.nan
+
+        results = np.column_stack((
+            cpu_percent,
+            current[:, MEMORY] / BYTES_PER_MIB,
+            current[:, MEMORY_LIMIT] / BYTES_PER_MIB,
+            memory_percent,
+            rates
+        ))
+        results = np.round(results, PRECISION)
+        # NaN never equals itself, so compare missing values separately
+        changed = ~(
+            (results == self._results[slots]) |
+            (np.isnan(results) & np.isnan(self._results[slots]))
+        ).all(axis=1)
+
+        self._totals += (np.nan_to_num(results) - np.nan_to_num(self._results[slots])).sum(axis=0)
+        self._results[slots] = results
+        self._previous[slots] = current
+        self._fresh[slots] = False
+        self._rows = self._results.tolist()
+        return [self._owners[slot] for slot in slots[changed]]
+
+    def get_computed(self):
+        """Return the owners and metrics of the slots of the last pass."""
+        return [self._owners[slot] for slot in self._computed], self._results[self._computed]
+
+    def get_info(self, slot):
+        """Return the metrics of a slot, None where there is no value (yet)."""
+        if slot is None:
+            return dict.fromkeys(METRICS)
+        return {
+            metric: (value if value == value else None)
+            for metric, value in zip(METRICS, self._rows[slot])
+        }
+
+    def get_sums(self, slots):
+        """Return the sum of each metric over some slots."""
+        sums = np.nan_to_num(self._results[slots]).sum(axis=0)
+        return {
+            metric: round(float(value), PRECISION)
+            for metric, value in zip(METRICS, sums)
+        }
+
+    def get_totals(self):
+        """Return the sum of each metric over all slots."""
+        return {
+            metric: round(float(value), PRECISION)
+            for metric, value in zip(METRICS, self._totals)
+        }
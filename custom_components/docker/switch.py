@@ -1,22 +1,18 @@
 """Support for Docker switches."""
 import logging
-from typing import Any, Dict
 
 from homeassistant.core import callback
 from homeassistant.const import CONF_NAME
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.helpers.entity import Entity
 from homeassistant.helpers.typing import HomeAssistantType
 from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.components.switch import SwitchEntity
 
+from .entity import DockerContainerEntity, DockerGroupEntity
 from .const import (
     DOMAIN,
-    CONF_CONTAINERS,
-    DATA_HOST,
-    DATA_VERSION_INFO,
-    DATA_UPDATED,
-    DOCKER_CLIENT
+    CONTAINERS_ADDED,
+    GROUPS_ADDED
 )
 
 _LOGGER = logging.getLogger(__name__)
@@ -26,29 +22,51 @@ async def async_setup_entry(
 ) -> None:
     """Set up the Docker Switch."""
 
-    switches = [ContainerSwitch(
-        hass = hass, 
-        api = hass.data[DOCKER_CLIENT][DATA_HOST], 
-        clientname = config_entry.data[CONF_NAME], 
-        container_name = container
-    ) for container in hass.data[DOCKER_CLIENT][CONF_CONTAINERS]]
+    host = hass.data[DOMAIN][config_entry.entry_id]
 
-    if switches:
-        async_add_entities(switches, True)
-    else:
-        _LOGGER.info("No containers setup")
-        return False
+    def create_switches(names):
+        return [ContainerSwitch(
+            hass = hass, 
+            api = host, 
+            clientname = config_entry.data[CONF_NAME], 
+            container_name = container
+        ) for container in names]
 
-class ContainerSwitch(SwitchEntity):
+    @callback
+    def async_containers_added(names):
+        """Add the switches of containers that appeared."""
+        async_add_entities(create_switches(names), True)
+
+    host.unsub_listeners.append(async_dispatcher_connect(
+        hass, CONTAINERS_ADDED.format(config_entry.entry_id), async_containers_added
+    ))
+    switches = create_switches(host.container_names)
+
+    def create_group_switches(groups):
+        return [GroupSwitch(
+            hass = hass,
+            api = host,
+            clientname = config_entry.data[CONF_NAME],
+            group = group
+        ) for group in groups]
+
+    @callback
+    def async_groups_added(groups):
+        """Add the switches of groups that appeared."""
+        async_add_entities(create_group_switches(groups), True)
+
+    if host.groups_enabled:
+        switches += create_group_switches(host.groups)
+        host.unsub_listeners.append(async_dispatcher_connect(
+            hass, GROUPS_ADDED.format(config_entry.entry_id), async_groups_added
+        ))
+    async_add_entities(switches, True)
+
+class ContainerSwitch(DockerContainerEntity, SwitchEntity):
     def __init__(self, hass, api, clientname, container_name):
-        self._hass = hass
-        self._api = api
-        self._clientname = clientname
-        self._container_name = container_name
+        super().__init__(hass, api, clientname, container_name)
         self._state = False
-        self._container = api.get_container(container_name)
-        self._unsub_update = None
-        self._attributes = self._container.get_info()
+        self._attributes = api.get_container(container_name).get_info()
 
     @property
     def unique_id(self) -> str:
@@ -64,45 +82,58 @@ class ContainerSwitch(SwitchEntity):
     def icon(self):
         return 'mdi:docker'
 
+    def _update_container(self, container):
+        self._state = container.get_state()
+
     @property
-    def device_state_attributes(self):
-        """Return the state attributes."""
-        return self._attributes
+    def is_on(self):
+        return self._state
 
-    async def async_added_to_hass(self):
-        """Handle entity which will be added."""
-        self._unsub_update = async_dispatcher_connect(
-            self._hass, DATA_UPDATED, self._schedule_immediate_update
-        )
+    async def async_turn_on(self, **kwargs) -> None:
+        """Turn on the switch."""
+        await self._api.async_container_action('start', names=[self._container_name])
 
-    @callback
-    def _schedule_immediate_update(self):
-        self.async_schedule_update_ha_state(True)
+    async def async_turn_off(self, **kwargs) -> None:
+        """Turn off the switch."""
+        await self._api.async_container_action('stop', names=[self._container_name])
+
+class GroupSwitch(DockerGroupEntity, SwitchEntity):
+    """Starts and stops all containers of a compose project or swarm service at once."""
+
+    def __init__(self, hass, api, clientname, group):
+        super().__init__(hass, api, clientname, group)
+        self._state = False
 
-    async def async_update(self) -> None:
-        self._state = self._container.get_state()
+    @property
+    def unique_id(self) -> str:
+        """Return the unique ID for this switch."""
+        return "docker_{}_group_{}".format(self._clientname, self._group)
 
     @property
-    def device_info(self) -> Dict[str, Any]:
-        """Return device information about this Docker host instance."""
-        return {
-            "identifiers": {
-                (DOMAIN, self._clientname, self._container_name)
-            },
-            "name": self._container_name.title(),
-            "manufacturer": "Docker",
-            "model": "Container",
-            "sw_version": self.hass.data[DOCKER_CLIENT][DATA_VERSION_INFO]["version"]
-        }
+    def name(self):
+        """Return the name of the switch."""
+        return self._group.title()
+
+    @property
+    def icon(self):
+        return 'mdi:docker'
+
+    def _update_state(self):
+        super()._update_state()
+        # On while any member runs
+        self._state = bool(self._get_group()['running'])
 
     @property
     def is_on(self):
         return self._state
 
-    def turn_on(self, **kwargs) -> None:
-        """Turn off the switch."""
-        self._container.start()
+    def _members(self):
+        return self._get_group()['members']
 
-    def turn_off(self, **kwargs) -> None:
-        """Turn off the switch."""
-        self._container.stop()
+    async def async_turn_on(self, **kwargs) -> None:
+        """Start all containers of the group, concurrently."""
+        await self._api.async_container_action('start', names=self._members())
+
+    async def async_turn_off(self, **kwargs) -> None:
+        """Stop all containers of the group, concurrently."""
+        await self._api.async_container_action('stop', names=self._members())
@@ -0,0 +1,51 @@
+"""Tests for the caches of the Docker integration."""
+import asyncio
+
+from custom_components.docker.api import DockerApiError
+from custom_components.docker.cache import ImageCache
+
+
+class FakeApi:
+    """Answers image inspects from a dict, counting them."""
+
+    def __init__(self, images):
+        self.images = images
+        self.inspects = 0
+
+    async def inspect_image(self, image_id):
+        self.inspects += 1
+        if image_id not in self.images:
+            raise DockerApiError("404: no such image")
+        return self.images[image_id]
+
+
+def image(tag):
+    return {'RepoTags': [tag], 'RepoDigests': ['{}@sha256:{}'.format(tag.partition(':')[0], tag)]}
+
+
+def test_resolve_keeps_other_images():
+    api = FakeApi({'a': image('a:1'), 'b': image('b:1'), 'c': image('c:1')})
+    cache = ImageCache()
+    asyncio.run(cache.async_resolve(api, ['a', 'b', 'c']))
+    # A single container inspect resolves only its own image
+    asyncio.run(cache.async_resolve(api, ['a']))
+    assert 'b' in cache and 'c' in cache
+    assert cache.get('b') == 'b:1'
+    assert api.inspects == 3
+
+
+def test_retain_forgets_images_not_in_use():
+    api = FakeApi({'a': image('a:1'), 'b': image('b:1')})
+    cache = ImageCache()
+    asyncio.run(cache.async_resolve(api, ['a', 'b']))
+    cache.retain(['a'])
+    assert 'a' in cache and 'b' not in cache
+
+
+def test_failed_inspect_is_not_retried_before_its_ttl():
+    api = FakeApi({})
+    cache = ImageCache(error_ttl=3600)
+    asyncio.run(cache.async_resolve(api, ['missing']))
+    asyncio.run(cache.async_resolve(api, ['missing']))
+    assert api.inspects == 1
+    assert cache.get('missing', 'fallback') == 'fallback'